@@ -0,0 +1,268 @@
+from mock_server import MockServer, get_objects_from_records, get_releases_from_records, get_positions_from_records
+from urllib.parse import urlparse, quote, unquote
+from contextlib import redirect_stdout
+from chromium import Chromium
+from colorama import Fore, init
+import tempfile
+import argparse
+import shutil
+import time
+import json
+import sys
+import io
+import os
+
+init(autoreset=True)
+
+
+class Benchmark(object):
+    """Benchmark the crawl stages against a local mock omahaproxy/GCS server, at several dataset sizes and workers"""
+
+    def __init__(self, json_report='chromium.stable.json', page_size=1000, latency=0.0, error_rate=0.0, seed=1,
+                 rate=10000, verbose=False):
+        """
+        :param json_report: the report to generate the datasets from (default chromium.stable.json)
+        :param page_size: the max results per listing page of the mock server (default 1000)
+        :param latency: seconds the mock server sleeps before each response (default 0)
+        :param error_rate: the probability of the mock server answering 503 (default 0)
+        :param seed: the random seed of the injected errors (default 1)
+        :param rate: requests per second of the crawler rate limiter, high enough to measure the code (default 10000)
+        :param verbose: show the crawler output (default False)
+        """
+
+        with open(json_report) as f:
+            self.chromium_downloads = json.loads(f.read())
+        self.page_size = int(page_size)
+        self.latency = float(latency)
+        self.error_rate = float(error_rate)
+        self.seed = seed
+        self.rate = rate
+        self.verbose = verbose
+        self.copy_version_offset = 1000
+        self.copy_position_offset = 10000000
+
+    def get_dataset(self, size):
+        """Function: get_dataset
+
+        Take the first size records of the report, in turn from every os type. A larger size is filled with copies of
+        the records, the copy k has the major version + k * 1000 and the positions + k * 10000000, so it never
+        collides with the real ones.
+
+        :return: dict of os_type -> version -> record
+        """
+
+        records = [(index, os_type, version, value)
+                   for os_type, values in self.chromium_downloads.items()
+                   for index, (version, value) in enumerate(values.items())]
+        records = [record[1:] for record in sorted(records, key=lambda record: record[0])]
+        dataset = dict()
+        for index in range(int(size)):
+            os_type, version, value = records[index % len(records)]
+            copy = index // len(records)
+            if copy > 0:
+                parts = version.split('.')
+                parts[0] = str(int(parts[0]) + copy * self.copy_version_offset)
+                version = '.'.join(parts)
+                value = self.get_copied_record(value, copy * self.copy_position_offset)
+            dataset.setdefault(os_type, {})[version] = value
+
+        return dataset
+
+    @staticmethod
+    def get_copied_record(value, offset):
+        """Function: get_copied_record
+
+        :return: the record with the positions and the download url moved by offset
+        """
+
+        download_url = urlparse(value['download_url'])
+        name = unquote(download_url.path.split('/o/', 1)[1])
+        prefix, download_position, file_name = name.split('/', 2)
+        download_position = int(download_position) + offset
+        name = quote('{0}/{1}/{2}'.format(prefix, download_position, file_name), safe='')
+        path = '{0}/o/{1}'.format(download_url.path.split('/o/', 1)[0], name)
+        copied = dict(value)
+        copied['position'] = int(value['position']) + offset
+        copied['download_position'] = download_position
+        copied['download_url'] = download_url._replace(path=path).geturl()
+
+        return copied
+
+    def start_mock_server(self, dataset):
+        """Function: start_mock_server"""
+
+        return MockServer(get_objects_from_records(dataset),
+                          page_size=self.page_size,
+                          releases=get_releases_from_records(dataset),
+                          positions=get_positions_from_records(dataset),
+                          latency=self.latency,
+                          error_rate=self.error_rate,
+                          seed=self.seed).start()
+
+    def get_crawler(self, engine, mock_server):
+        """Function: get_crawler"""
+
+        kwargs = dict(fore_crawl=True,
+                      omahaproxy_host=mock_server.url,
+                      googleapis_host=mock_server.url,
+                      omahaproxy_rate=self.rate,
+                      googleapis_rate=self.rate,
+                      checkpoint_file=None)
+        if engine == 'async':
+            from chromium_async import AsyncChromium
+            return AsyncChromium(**kwargs)
+
+        return Chromium(**kwargs)
+
+    def run_case(self, engine, size, workers):
+        """Function: run_case
+
+        Crawl one dataset in a temp directory
+
+        :return: dict of the case parameters, the stage wall times, the requests and the throughput
+        """
+
+        dataset = self.get_dataset(size)
+        mock_server = self.start_mock_server(dataset)
+        cur_dir = os.getcwd()
+        work_dir = tempfile.mkdtemp(prefix='chromium-benchmark-')
+        output = sys.stdout if self.verbose is True else io.StringIO()
+        try:
+            os.chdir(work_dir)
+            crawler = self.get_crawler(engine, mock_server)
+            start_time = time.time()
+            try:
+                with redirect_stdout(output):
+                    # The workers are the threads of every stage, or the concurrent requests per host of async
+                    crawler.run(workers=workers)
+            except SystemExit:
+                if self.verbose is False:
+                    print(output.getvalue())
+                raise Exception('Error: The crawler exited, engine={0} size={1} workers={2}'.format(engine, size,
+                                                                                                   workers))
+            duration = time.time() - start_time
+        finally:
+            os.chdir(cur_dir)
+            shutil.rmtree(work_dir, ignore_errors=True)
+            mock_server.stop()
+        records = sum(len(values) for values in crawler.chromium_downloads.values())
+        metrics = crawler.metrics.to_dict()
+
+        return {'engine': engine,
+                'size': int(size),
+                'workers': int(workers),
+                'latency': self.latency,
+                'error_rate': self.error_rate,
+                'duration_seconds': duration,
+                'stages_seconds': metrics['stages_seconds'],
+                'records': records,
+                'records_per_second': records / duration if duration > 0 else 0.0,
+                'requests': mock_server.requests,
+                'injected_errors': mock_server.errors}
+
+    def run(self, engines, sizes, workers_list, repeat=1):
+        """Function: run
+
+        :return: list of the results of every (engine, size, workers) case, the fastest of repeat runs
+        """
+
+        results = list()
+        for engine in engines:
+            for size in sizes:
+                for workers in workers_list:
+                    runs = [self.run_case(engine, size, workers) for _ in range(repeat)]
+                    result = min(runs, key=lambda run: run['duration_seconds'])
+                    print('Info: {engine:<6} size={size:<6} workers={workers:<4} {duration_seconds:8.2f}s '
+                          '{records_per_second:10.1f} records/s {requests:6} requests'.format(**result))
+                    results.append(result)
+
+        return results
+
+    @staticmethod
+    def get_case_key(result):
+        """Function: get_case_key"""
+
+        return result['engine'], result['size'], result['workers'], result['latency'], result['error_rate']
+
+    def compare(self, results, baseline_results, tolerance=0.2, min_seconds=0.05):
+        """Function: compare
+
+        :param tolerance: the allowed slow down of a stage, relative to the baseline (default 0.2)
+        :param min_seconds: the slow downs below it are noise (default 0.05)
+        :return: list of the regression messages
+        """
+
+        baseline = dict((self.get_case_key(result), result) for result in baseline_results)
+        regressions = list()
+        for result in results:
+            baseline_result = baseline.get(self.get_case_key(result))
+            if baseline_result is None:
+                continue
+            stages = dict(result['stages_seconds'])
+            stages['total'] = result['duration_seconds']
+            baseline_stages = dict(baseline_result['stages_seconds'])
+            baseline_stages['total'] = baseline_result['duration_seconds']
+            for stage, seconds in stages.items():
+                baseline_seconds = baseline_stages.get(stage)
+                if baseline_seconds is None:
+                    continue
+                if seconds > baseline_seconds * (1 + tolerance) and seconds - baseline_seconds > min_seconds:
+                    regressions.append('{0} size={1} workers={2} {3}: {4:.2f}s -> {5:.2f}s'.format(
+                        result['engine'], result['size'], result['workers'], stage, baseline_seconds, seconds))
+
+        return regressions
+
+
+def parse_list(value, item_type=str):
+    """Function: parse_list, such as 100,1000 -> [100, 1000]"""
+
+    return [item_type(item) for item in value.split(',') if item.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the crawl stages against a local mock server...')
+    parser.add_argument('-r', '--report', default='chromium.stable.json',
+                        help='The json report to generate the datasets from. Default: chromium.stable.json')
+    parser.add_argument('-s', '--sizes', default='100,1000,5000',
+                        help='Comma separated dataset sizes, in records. Default: 100,1000,5000')
+    parser.add_argument('-w', '--workers', default='10,50',
+                        help='Comma separated workers of every stage. Default: 10,50')
+    parser.add_argument('-e', '--engines', default='thread',
+                        help='Comma separated engines: thread, async. Default: thread')
+    parser.add_argument('--page-size', type=int, default=1000,
+                        help='The max results per listing page. Default: 1000')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds the mock server sleeps before each response. Default: 0')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='The probability of the mock server answering 503. Default: 0')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Run every case repeat times and keep the fastest. Default: 1')
+    parser.add_argument('-o', '--output', default='benchmark.results.json',
+                        help='The file to record the results. Default: benchmark.results.json')
+    parser.add_argument('-b', '--baseline', default=None,
+                        help='The results of a previous run, exit 1 if any stage is slower. Default: no comparison')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='The allowed slow down relative to the baseline. Default: 0.2')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Show the crawler output')
+    args = parser.parse_args()
+    benchmark = Benchmark(json_report=args.report,
+                          page_size=args.page_size,
+                          latency=args.latency,
+                          error_rate=args.error_rate,
+                          verbose=args.verbose)
+    benchmark_results = benchmark.run(engines=parse_list(args.engines),
+                                      sizes=parse_list(args.sizes, int),
+                                      workers_list=parse_list(args.workers, int),
+                                      repeat=args.repeat)
+    with open(args.output, 'w+') as f:
+        json.dump(benchmark_results, f, indent=4)
+    print('Info: Results written to {0}'.format(args.output))
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            benchmark_regressions = benchmark.compare(benchmark_results, json.loads(f.read()), args.tolerance)
+        for regression in benchmark_regressions:
+            print(Fore.RED + 'Error: Regression: {0}'.format(regression))
+        if benchmark_regressions:
+            sys.exit(1)
+        print('Info: No regression against {0}'.format(args.baseline))
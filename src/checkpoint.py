@@ -0,0 +1,139 @@
+from threading import Lock
+import json
+import os
+
+
+class Checkpoint(object):
+    """Append-only NDJSON journal of the finished stages and items, so an interrupted crawl could resume"""
+
+    def __init__(self, checkpoint_file='chromium.checkpoint.ndjson', run_key=None):
+        """
+        :param checkpoint_file: the journal file, None to disable the checkpoint
+        :param run_key: dict of the run parameters, a journal written with other parameters is discarded
+        """
+
+        self.checkpoint_file = checkpoint_file
+        self.run_key = run_key or dict()
+        self.stages = set()
+        self.failures = dict()
+        self.lock = Lock()
+        self.f = None
+
+    @property
+    def enabled(self):
+        return self.checkpoint_file is not None
+
+    def __write(self, entry, sync=False):
+        """Private Function: __write"""
+
+        if self.enabled is False:
+            return
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self.lock:
+            if self.f is None:
+                self.f = open(self.checkpoint_file, 'a')
+                if self.f.tell() > 0:
+                    # Terminate a line truncated by a crash, so it does not swallow the next entry
+                    with open(self.checkpoint_file, 'rb') as last_f:
+                        last_f.seek(-1, os.SEEK_END)
+                        if last_f.read(1) != b'\n':
+                            self.f.write('\n')
+            self.f.write(line)
+            self.f.flush()
+            if sync is True:
+                os.fsync(self.f.fileno())
+
+    def load(self):
+        """Function: load
+
+        :return: list of (stage, os_type, version, value) of the finished items. A truncated last line is ignored.
+        """
+
+        items = list()
+        self.stages = set()
+        self.failures = dict()
+        failures = 0
+        if self.enabled is False or os.path.exists(self.checkpoint_file) is False:
+            self.__write({'type': 'run', 'run_key': self.run_key}, sync=True)
+            return items
+        header = None
+        with open(self.checkpoint_file) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if header is None:
+                    header = entry
+                    if entry.get('type') != 'run' or entry.get('run_key') != self.run_key:
+                        break
+                elif entry.get('type') == 'stage':
+                    self.stages.add(entry['stage'])
+                elif entry.get('type') == 'item':
+                    items.append((entry['stage'], entry['os'], entry['version'], entry['value']))
+                elif entry.get('type') == 'failure':
+                    failures += 1
+        if header is None or header.get('type') != 'run' or header.get('run_key') != self.run_key:
+            print('Info: Discard the checkpoint of another run: {0}'.format(self.checkpoint_file))
+            self.clear()
+            return self.load()
+        if items or self.stages:
+            print('Info: Resume from the checkpoint: {0} stages, {1} items done, '
+                  '{2} failed items to retry'.format(len(self.stages), len(items), failures))
+
+        return items
+
+    def record(self, stage, os_type, version, value):
+        """Function: record"""
+
+        self.__write({'type': 'item', 'stage': stage, 'os': os_type, 'version': version, 'value': value})
+
+    def fail(self, stage, os_type, version=None):
+        """Function: fail
+
+        Journal an item of the stage that failed, such as a request error. The stage is not done then, and the item is
+        pending again on the next run, see Chromium.iter_pending_items.
+
+        :param version: the version, or None if the whole os type failed, such as its history.json
+        """
+
+        with self.lock:
+            self.failures[stage] = self.failures.get(stage, 0) + 1
+        self.__write({'type': 'failure', 'stage': stage, 'os': os_type, 'version': version})
+
+    def get_failures(self, stage=None):
+        """Function: get_failures
+
+        :return: the count of the failed items of the stage in this run, or of all the stages if None
+        """
+
+        if stage is None:
+            return sum(self.failures.values())
+
+        return self.failures.get(stage, 0)
+
+    def done(self, stage):
+        """Function: done"""
+
+        self.stages.add(stage)
+        self.__write({'type': 'stage', 'stage': stage}, sync=True)
+
+    def is_done(self, stage):
+        """Function: is_done"""
+
+        return stage in self.stages
+
+    def clear(self):
+        """Function: clear
+
+        Remove the journal, when the run finished and its results are in the reports
+        """
+
+        with self.lock:
+            if self.f is not None:
+                self.f.close()
+                self.f = None
+            if self.enabled is True and os.path.exists(self.checkpoint_file):
+                os.remove(self.checkpoint_file)
+        self.stages = set()
+        self.failures = dict()
@@ -1,11 +1,22 @@
 from requests.packages.urllib3.util.retry import Retry
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, Future
 from requests.adapters import HTTPAdapter
+from rate_limiter import RateLimiter
+from downloader import Downloader, DownloadError
+from chromium_index import ChromiumIndex
+from history_store import HistoryStore
+from chromium_record import ChromiumRecord
+from checkpoint import Checkpoint
+from metrics import Metrics
 from colorama import Fore, init
-from copy import deepcopy
+from threading import Lock
+from array import array
 import traceback
+import zlib
+import bisect
 import requests
 import argparse
+import sqlite3
 import shutil
 import time
 import json
@@ -14,6 +25,12 @@ import csv
 import os
 import re
 
+try:
+    from urllib.parse import urlparse, parse_qs, unquote, quote
+except ImportError:
+    from urlparse import urlparse, parse_qs
+    from urllib import unquote, quote
+
 requests.packages.urllib3.disable_warnings()
 init(autoreset=True)
 
@@ -21,8 +38,14 @@ init(autoreset=True)
 class Chromium(object):
     """Download all the chromium old stable versions"""
 
-    def __init__(self, channel='stable', fore_crawl=False):
+    def __init__(self, channel='stable', fore_crawl=False, position_offset=100,
+                 positions_cache='chromium.positions.db', positions_cache_ttl=604800, refresh_positions=False,
+                 omahaproxy_host='https://omahaproxy.appspot.com', googleapis_host='https://www.googleapis.com',
+                 omahaproxy_rate=2, googleapis_rate=50, download_chunks=4,
+                 checkpoint_file='chromium.checkpoint.ndjson', shard=None, metrics_file=None, artifact_rules=None,
+                 direct_urls=False):
         self.channel = channel
+        self.shard = self.parse_shard(shard)
         self.force_crawl = self.validate_boole(fore_crawl)
         self.strip_chars = ' \r\n\t/"\',\\'
         self.os_type = {'mac': 'Mac/',
@@ -31,28 +54,83 @@ class Chromium(object):
                         'linux': 'Linux/',
                         'linux64': 'Linux_x64/',
                         'android': 'Android/'}
-        self.omahaproxy_host = 'https://omahaproxy.appspot.com'
-        self.chromium_download_url_template = 'https://www.googleapis.com/download/storage/v1/b/' \
-                                              'chromium-browser-snapshots/o/{0}?alt=media'
-        self.chromium_prefix_url_template = 'https://www.googleapis.com/storage/v1/b/chromium-browser-snapshots/o?' \
-                                            'delimiter=/&' \
-                                            'prefix={0}&' \
-                                            'fields=items(kind,mediaLink,metadata,name,size,updated),' \
-                                            'kind,prefixes,nextPageToken'
-        self.chromium_prefix_url_with_token_template = self.chromium_prefix_url_template + '&pageToken={1}'
-        status_forcelist = [500, 502, 503, 504, 522, 524, 408, 400, 401, 403]
-        retries = Retry(total=10, read=10, connect=10, backoff_factor=3, status_forcelist=status_forcelist)
+        self.omahaproxy_host = omahaproxy_host.rstrip('/')
+        self.googleapis_host = googleapis_host.rstrip('/')
+        # The archive file names of each os type, the first one found in the prefix wins
+        self.artifact_rules = {'mac': ['chrome-mac.zip'],
+                               'win': ['chrome-win.zip', 'chrome-win32.zip'],
+                               'win64': ['chrome-win.zip', 'chrome-win32.zip'],
+                               'linux': ['chrome-linux.zip'],
+                               'linux64': ['chrome-linux.zip'],
+                               'android': ['chrome-android.zip']}
+        self.artifact_rules.update(artifact_rules or dict())
+        # Without a rule match, the largest file not containing these strings wins
+        self.artifact_filter_strings = ['browser_tests', 'syms', 'shell', 'host', 'exe']
+        self.direct_urls = self.validate_boole(direct_urls)
+        self.prefix_items = dict()
+        self.new_prefix_items = dict()
+        self.prefix_items_lock = Lock()
+        self.chromium_download_url_template = (self.googleapis_host +
+                                               '/download/storage/v1/b/chromium-browser-snapshots/o/{0}?alt=media')
+        self.chromium_prefix_url_template = (self.googleapis_host +
+                                             '/storage/v1/b/chromium-browser-snapshots/o?'
+                                             'delimiter=/&'
+                                             'prefix={0}&'
+                                             'fields=items(kind,mediaLink,metadata,name,size,updated),'
+                                             'kind,prefixes,nextPageToken')
+        # The download prefix of the reports is chromium_prefix_url_template, the listing also asks for the md5Hash
+        # to verify the downloads
+        self.chromium_prefix_listing_url_template = (self.googleapis_host +
+                                                     '/storage/v1/b/chromium-browser-snapshots/o?'
+                                                     'delimiter=/&'
+                                                     'prefix={0}&'
+                                                     'fields=items(kind,mediaLink,metadata,name,size,md5Hash,updated),'
+                                                     'kind,prefixes,nextPageToken')
+        self.rate_limiter = RateLimiter(host_rates={urlparse(self.omahaproxy_host).netloc: omahaproxy_rate,
+                                                   urlparse(self.googleapis_host).netloc: googleapis_rate})
+        self.status_forcelist = [500, 502, 503, 504, 522, 524, 408, 400, 401, 403, 429]
+        self.retry_total = 10
+        self.backoff_factor = 3
+        # The 429/503 are retried by request() through the rate limiter, urllib3 would retry them past the limiter
+        retries = Retry(total=self.retry_total, read=self.retry_total, connect=self.retry_total,
+                        backoff_factor=self.backoff_factor,
+                        status_forcelist=[status_code for status_code in self.status_forcelist
+                                          if status_code not in self.rate_limiter.slow_down_status_codes])
         self.session = requests.session()
         self.session.mount('http://', HTTPAdapter(max_retries=retries))
         self.session.mount('https://', HTTPAdapter(max_retries=retries))
         self.session.verify = False
+        self.metrics = Metrics()
+        self.metrics_file = metrics_file
+        self.coalesced_requests = dict()
+        self.coalesced_requests_lock = Lock()
+        self.coalesced_requests_saved = 0
         self.chromium_versions = dict()
+        self.chromium_releases = dict()
         self.chromium_position_urls = dict()
         self.chromium_positions = dict()
         self.chromium_downloads = dict()
+        self.chromium_download_items = dict()
         self.time_out = 300
-        self.position_offset = 100
+        self.downloader = Downloader(self.request, time_out=self.time_out, chunk_workers=download_chunks,
+                                     on_bytes=self.observe_download_bytes)
+        self.position_offset = int(position_offset)
         self.chromium_existed_positions = dict()
+        self.chromium_existed_positions_index = dict()
+        self.failed_listing_os_types = set()
+        self.positions_cache = positions_cache
+        self.positions_cache_ttl = int(positions_cache_ttl)
+        self.positions_cache_version = 1
+        # How far above the highest cached position the incremental refresh lists, see get_refresh_ranges
+        self.positions_refresh_window = 100000
+        self.refresh_positions = self.validate_boole(refresh_positions)
+        if checkpoint_file is not None:
+            checkpoint_file = self.get_shard_file_path(self.get_channel_file_path(checkpoint_file))
+        self.checkpoint = Checkpoint(checkpoint_file, run_key={'channel': self.channel,
+                                                               'force_crawl': self.force_crawl,
+                                                               'omahaproxy_host': self.omahaproxy_host,
+                                                               'googleapis_host': self.googleapis_host,
+                                                               'shard': self.shard})
 
     @staticmethod
     def validate_boole(target):
@@ -68,42 +146,399 @@ class Chromium(object):
 
         return target
 
-    def __get_existed_positions_core(self, url, os_type, ini_start=False):
-        """Private Function: __get_existed_positions_core"""
+    @staticmethod
+    def parse_shard(shard):
+        """Function: parse_shard
 
-        try:
-            res = self.session.get(url, timeout=self.time_out)
-            status_code = res.status_code
-            if status_code != 200:
-                error_message = 'Fatal: Unexpected status code detected ' \
-                                'when requesting prefix url: {0}, {1}'.format(status_code, url)
-                print(Fore.YELLOW + error_message)
-                sys.exit(1)
-            content = json.loads(res.content)
+        :param shard: 'i/N' such as '0/4', or None
+        :return: [i, N], or None if not sharded
+        """
+
+        if shard is None:
+            return None
+        match = re.match(r'^\s*(\d+)\s*/\s*(\d+)\s*$', str(shard))
+        if match is None or int(match.group(2)) < 1 or int(match.group(1)) >= int(match.group(2)):
+            raise Exception('Error: The expected input for shard should be i/N with 0 <= i < N: {0}'.format(shard))
+
+        return [int(match.group(1)), int(match.group(2))]
+
+    def get_channel_file_path(self, file_path):
+        """Function: get_channel_file_path
+
+        :return: the file path of this channel, such as mac.history.json -> mac.history.beta.json. The stable channel
+                 keeps the file path as is.
+        """
+
+        if self.channel == 'stable':
+            return file_path
+        root, ext = os.path.splitext(file_path)
+
+        return '{0}.{1}{2}'.format(root, self.channel, ext)
+
+    def share_resources(self, chromium):
+        """Function: share_resources
+
+        Use the session, the rate limiter, the metrics, the request cache (deps.json and prefix listings), the existed
+        positions and the prefix items of another Chromium, such as the one of another channel. So the channels of one
+        invocation list the snapshot prefixes and look up deps.json only once.
+        """
+
+        self.session = chromium.session
+        self.rate_limiter = chromium.rate_limiter
+        self.metrics = chromium.metrics
+        self.coalesced_requests = chromium.coalesced_requests
+        self.coalesced_requests_lock = chromium.coalesced_requests_lock
+        self.chromium_existed_positions = chromium.chromium_existed_positions
+        self.chromium_existed_positions_index = chromium.chromium_existed_positions_index
+        self.prefix_items = chromium.prefix_items
+        self.new_prefix_items = chromium.new_prefix_items
+        self.prefix_items_lock = chromium.prefix_items_lock
+
+    def get_shard_file_path(self, file_path):
+        """Function: get_shard_file_path
+
+        :return: the file path of this shard, such as chromium.stable.json -> chromium.stable.shard-0-of-4.json
+        """
+
+        if self.shard is None:
+            return file_path
+        root, ext = os.path.splitext(file_path)
+
+        return '{0}.shard-{1}-of-{2}{3}'.format(root, self.shard[0], self.shard[1], ext)
+
+    def is_in_shard(self, os_type, version):
+        """Function: is_in_shard
+
+        The (os_type, version) work is partitioned by crc32, so every shard gets the same split on any node
+
+        :return: True if the version belongs to this shard, or not sharded
+        """
+
+        if self.shard is None:
+            return True
+        key = '{0}/{1}'.format(os_type, version).encode('utf-8')
+
+        return zlib.crc32(key) % self.shard[1] == self.shard[0]
+
+    def request(self, url, **kwargs):
+        """Function: request
+
+        GET the url through the shared rate limiter. The 429/503 responses slow down the host, and are retried here
+        up to retry_total times, every attempt waits for the limiter and the Retry-After; the others let it speed up
+        again. The other status_forcelist codes and the connection errors are retried by urllib3.
+        """
+
+        host = urlparse(url).netloc
+        retry = 0
+        start_time = time.time()
+        while True:
+            self.rate_limiter.acquire(host)
             try:
-                prefixes = content['prefixes']
-            except KeyError:
-                error_message = 'Fatal: Prefixes not in response: {0}, {1}'.format(url, content)
-                print(Fore.YELLOW + error_message)
-                sys.exit(1)
-            prefixes_with_position = {re.search('/(.*?)/', prefix).group(1): prefix for prefix in prefixes}
-            if ini_start is True:
-                self.chromium_existed_positions[os_type] = prefixes_with_position
+                res = self.session.get(url, **kwargs)
+            except requests.RequestException:
+                self.metrics.observe_request(host, 'error', time.time() - start_time, retry)
+                raise
+            retries = getattr(res.raw, 'retries', None)
+            history = retries.history if retries is not None else tuple()
+            for item in history:
+                self.rate_limiter.feedback(host, item.status)
+            self.rate_limiter.feedback(host, res.status_code, res.headers.get('Retry-After'))
+            retry += len(history)
+            if res.status_code not in self.rate_limiter.slow_down_status_codes or retry >= self.retry_total:
+                break
+            res.close()
+            retry += 1
+            if retry > 1:
+                time.sleep(self.backoff_factor * (2 ** (retry - 1)))
+        # The streamed bodies are counted by observe_download_bytes
+        count = 0 if kwargs.get('stream') is True else len(res.content)
+        self.metrics.observe_request(host, res.status_code, time.time() - start_time, retry, count)
+
+        return res
+
+    def observe_download_bytes(self, url, count):
+        """Function: observe_download_bytes"""
+
+        self.metrics.observe_bytes(urlparse(url).netloc, count)
+
+    def write_metrics(self):
+        """Function: write_metrics
+
+        Write the request and stage metrics of the run to self.metrics_file, if provided
+        """
+
+        if self.metrics_file is not None:
+            self.metrics.write(self.get_shard_file_path(self.metrics_file))
+
+    def fetch(self, url):
+        """Function: fetch
+
+        GET the url once per run: the concurrent and later calls with the same url share the in-flight future.
+        Used for history.json, deps.json and prefix urls, which are repeated across the os types, the versions and
+        the channels. Only the parsed json is kept in the future, the response body is dropped once parsed.
+
+        :return: (status_code, the parsed json of the 200 response, or None)
+        """
+
+        with self.coalesced_requests_lock:
+            future = self.coalesced_requests.get(url)
+            owner = future is None
+            if owner is True:
+                future = Future()
+                self.coalesced_requests[url] = future
             else:
-                self.chromium_existed_positions[os_type].update(prefixes_with_position)
+                self.coalesced_requests_saved += 1
+        if owner is True:
             try:
-                next_page_token = content['nextPageToken']
-            except KeyError:
-                next_page_token = None
+                res = self.request(url, timeout=self.time_out)
+                future.set_result(self.parse_response(res.status_code, res.content))
+            except Exception as e:
+                future.set_exception(e)
 
-            return next_page_token
+        return future.result()
+
+    @staticmethod
+    def parse_response(status_code, content):
+        """Function: parse_response
+
+        :return: (status_code, the parsed json of the 200 response, or None)
+        """
+
+        if status_code != 200:
+            return status_code, None
+
+        return status_code, json.loads(content)
+
+    def report_coalesced_requests(self):
+        """Function: report_coalesced_requests"""
+
+        print('Info: {0} unique requests, {1} duplicated requests saved'.format(len(self.coalesced_requests),
+                                                                               self.coalesced_requests_saved))
+
+    def process_existed_positions(self, os_type, url, status_code, content):
+        """Function: process_existed_positions
+
+        Merge one page of the prefix listing into chromium_existed_positions
+
+        :return: the next page token, or None if it is the last page
+        """
+
+        if status_code != 200:
+            error_message = 'Fatal: Unexpected status code detected ' \
+                            'when requesting prefix url: {0}, {1}'.format(status_code, url)
+            print(Fore.YELLOW + error_message)
+            sys.exit(1)
+        content = json.loads(content)
+        try:
+            prefixes = content['prefixes']
+        except KeyError:
+            # Empty listing: no prefixes in the requested range
+            prefixes = list()
+        prefixes_with_position = {re.search('/(.*?)/', prefix).group(1): prefix for prefix in prefixes}
+        self.chromium_existed_positions[os_type].update(prefixes_with_position)
+        try:
+            next_page_token = content['nextPageToken']
+        except KeyError:
+            next_page_token = None
+
+        return next_page_token
+
+    def __get_existed_positions_core(self, url, os_type):
+        """Private Function: __get_existed_positions_core"""
+
+        try:
+            res = self.request(url, timeout=self.time_out)
+
+            return self.process_existed_positions(os_type, url, res.status_code, res.content)
         except (requests.RequestException,
                 requests.exceptions.SSLError,
                 requests.packages.urllib3.exceptions.SSLError) as e:
-            error_message = 'Error: Unexpected error when requesting history url: {0}, {1}'.format(url, e)
+            error_message = 'Error: Unexpected error when requesting prefix url: {0}, {1}'.format(url, e)
             print(Fore.RED + error_message)
+            self.failed_listing_os_types.add(os_type)
+
+    def open_positions_cache(self):
+        """Function: open_positions_cache
 
-    def get_existed_positions(self):
+        Open the sqlite cache of the existed positions. The cache is dropped if its version does not match.
+        """
+
+        connection = sqlite3.connect(self.positions_cache)
+        connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        row = connection.execute('SELECT value FROM meta WHERE key = ?', ('version',)).fetchone()
+        if row is None or int(row[0]) != self.positions_cache_version:
+            connection.execute('DROP TABLE IF EXISTS positions')
+            connection.execute('DROP TABLE IF EXISTS crawls')
+            connection.execute('DROP TABLE IF EXISTS prefix_items')
+            connection.execute('DELETE FROM meta')
+            connection.execute('INSERT INTO meta (key, value) VALUES (?, ?)',
+                               ('version', str(self.positions_cache_version)))
+        connection.execute('CREATE TABLE IF NOT EXISTS positions '
+                           '(os_type TEXT, position TEXT, prefix TEXT, PRIMARY KEY (os_type, position))')
+        connection.execute('CREATE TABLE IF NOT EXISTS crawls (os_type TEXT PRIMARY KEY, full_crawl_at REAL)')
+        connection.execute('CREATE TABLE IF NOT EXISTS prefix_items '
+                           '(os_type TEXT, position TEXT, items TEXT, PRIMARY KEY (os_type, position))')
+        connection.commit()
+
+        return connection
+
+    def __load_positions_cache(self, connection, os_type):
+        """Private Function: __load_positions_cache
+
+        The shards honour a valid cache even with force crawl: the positions are listed once before the shards start,
+        see the positions command, instead of by every shard.
+
+        :return: the cached positions of the os type, or None if missing, expired or refresh required
+        """
+
+        if self.refresh_positions is True or (self.force_crawl is True and self.shard is None):
+            return None
+        row = connection.execute('SELECT full_crawl_at FROM crawls WHERE os_type = ?', (os_type,)).fetchone()
+        if row is None or time.time() - row[0] > self.positions_cache_ttl:
+            return None
+        rows = connection.execute('SELECT position, prefix FROM positions WHERE os_type = ?', (os_type,))
+
+        return {position: prefix for position, prefix in rows}
+
+    def __save_positions_cache(self, connection, os_type, full_crawl):
+        """Private Function: __save_positions_cache"""
+
+        positions = self.chromium_existed_positions.get(os_type, {})
+        if full_crawl is True:
+            connection.execute('DELETE FROM positions WHERE os_type = ?', (os_type,))
+            connection.execute('INSERT OR REPLACE INTO crawls (os_type, full_crawl_at) VALUES (?, ?)',
+                               (os_type, time.time()))
+        connection.executemany('INSERT OR REPLACE INTO positions (os_type, position, prefix) VALUES (?, ?, ?)',
+                               [(os_type, position, prefix) for position, prefix in positions.items()])
+        connection.commit()
+
+    def __list_existed_positions(self, os_type, url):
+        """Private Function: __list_existed_positions
+
+        Walk all the pages of a prefix listing, following the nextPageToken
+        """
+
+        next_page_token = self.__get_existed_positions_core(url, os_type)
+        while next_page_token is not None:
+            page_url = '{0}&pageToken={1}'.format(url, next_page_token)
+            next_page_token = self.__get_existed_positions_core(page_url, os_type)
+
+    @staticmethod
+    def get_position_ranges(prefix, range_digits=1):
+        """Function: get_position_ranges
+
+        Split a prefix into lexicographic [startOffset, endOffset) ranges by the leading digits of the position.
+        For example, range_digits=1 splits Mac/ into: [, Mac/1), [Mac/1, Mac/2), ..., [Mac/9, ).
+
+        :param prefix: the os prefix, such as Mac/
+        :param range_digits: how many leading digits to split by (default 1), 0 means no split
+        :return: list of (start_offset, end_offset), None means unbounded
+        """
+
+        if range_digits <= 0:
+            return [(None, None)]
+        boundaries = [None]
+        boundaries.extend('{0}{1}'.format(prefix, i) for i in range(10 ** (range_digits - 1), 10 ** range_digits))
+        boundaries.append(None)
+
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    @staticmethod
+    def get_refresh_ranges(prefix, max_position, window=100000):
+        """Function: get_refresh_ranges
+
+        The listing compares startOffset/endOffset as text, so Mac/1000001/ sorts before Mac/999999/, and the shorter
+        positions interleave with the longer ones. Split [max_position, max_position + window) by the digit count
+        instead, each range is lexicographically ordered as the numbers are. For example, 999999 is refreshed with:
+        [Mac/999999/, Mac/9999990), [Mac/1000000/, Mac/10999980).
+        The shorter positions listed again are limited to about window / 10.
+
+        :param prefix: the os prefix, such as Mac/
+        :param max_position: the highest cached position
+        :param window: how many positions above max_position to list (default 100000)
+        :return: list of (start_offset, end_offset)
+        """
+
+        ranges = list()
+        digits = len(str(max_position))
+        while 10 ** (digits - 1) < max_position + window:
+            low = max(max_position, 10 ** (digits - 1))
+            high = min(max_position + window, 10 ** digits)
+            if low < high:
+                # Mac/<high - 1>/ sorts before Mac/<high - 1>0, and Mac/<high>/ after it
+                ranges.append(('{0}{1}/'.format(prefix, low), '{0}{1}0'.format(prefix, high - 1)))
+            digits += 1
+
+        return ranges
+
+    def prepare_existed_positions_urls(self, connection, range_digits=1):
+        """Function: prepare_existed_positions_urls
+
+        Load the cached positions, and prepare the prefix listing urls still to crawl.
+
+        :param connection: the positions cache connection, see open_positions_cache
+        :param range_digits: how many leading position digits to split each prefix by (default 1)
+        :return: (list of (os_type, url), list of os types to be fully crawled)
+        """
+
+        listing_urls = list()
+        full_crawl_os_types = list()
+        self.failed_listing_os_types = set()
+        for os_type, prefix in self.os_type.items():
+            url = self.chromium_prefix_url_template.format(prefix)
+            cached_positions = self.__load_positions_cache(connection, os_type)
+            if cached_positions and self.shard is not None:
+                # All the shards use the same positions, so their nearest positions match the ones of a plain run
+                print('Info: Use the cached existed positions for {0}'.format(os_type))
+                self.chromium_existed_positions[os_type] = cached_positions
+                continue
+            elif cached_positions:
+                print('Info: Get the new existed positions for {0}...'.format(os_type))
+                self.chromium_existed_positions[os_type] = cached_positions
+                max_position = max(int(position) for position in cached_positions.keys() if position.isdigit())
+                ranges = self.get_refresh_ranges(prefix, max_position, self.positions_refresh_window)
+            else:
+                if self.shard is not None:
+                    error_message = 'Error: No valid positions cache for {0}, every shard lists it again, ' \
+                                    'run the positions command before the shards'.format(os_type)
+                    print(Fore.YELLOW + error_message)
+                print('Info: Get all the existed positions for {0}...'.format(os_type))
+                self.chromium_existed_positions[os_type] = dict()
+                full_crawl_os_types.append(os_type)
+                ranges = self.get_position_ranges(prefix, range_digits)
+            for start_offset, end_offset in ranges:
+                range_url = url
+                if start_offset is not None:
+                    range_url = '{0}&startOffset={1}'.format(range_url, start_offset)
+                if end_offset is not None:
+                    range_url = '{0}&endOffset={1}'.format(range_url, end_offset)
+                listing_urls.append((os_type, range_url))
+
+        return listing_urls, full_crawl_os_types
+
+    def save_existed_positions(self, connection, full_crawl_os_types):
+        """Function: save_existed_positions
+
+        Save the crawled positions to the cache, and build the positions index. If any listing of an os type failed,
+        its positions are used for this run only: the cache of the os type is kept as is, so the next run lists the
+        missing positions again. The shards only read the cache, they would rewrite it concurrently.
+        """
+
+        for os_type in self.os_type.keys():
+            if not self.chromium_existed_positions[os_type]:
+                error_message = 'Fatal: No prefixes found for os type: {0}'.format(os_type)
+                print(Fore.YELLOW + error_message)
+                sys.exit(1)
+            if os_type in self.failed_listing_os_types:
+                error_message = 'Error: Some prefix listings failed, not caching the positions of: {0}'.format(os_type)
+                print(Fore.RED + error_message)
+                continue
+            if self.shard is not None:
+                continue
+            self.__save_positions_cache(connection, os_type, full_crawl=os_type in full_crawl_os_types)
+        self.build_existed_positions_index()
+
+    def get_existed_positions(self, workers=24, range_digits=1):
         """Function: get_existed_positions
 
         Crawl all the existing positions by using the API:
@@ -111,16 +546,128 @@ class Chromium(object):
         delimiter=/&prefix=Mac/&fields=items(kind,mediaLink,metadata,name,size,updated),kind,prefixes,nextPageToken&
         pageToken=CgtNYWMvMTA1NDkzLw
 
-        Note: Cannot use ThreadPoolExecutor to run parallel, because the api does not support
+        The page tokens are sequential within one listing, so each os prefix is split into position ranges
+        (startOffset/endOffset, see get_position_ranges), and all the ranges of all the os types are listed in parallel.
+
+        The positions are cached to the sqlite file self.positions_cache. When the cache is still valid (see
+        self.positions_cache_ttl), only the positions above the highest cached one are listed, see get_refresh_ranges.
+        Use refresh_positions or force crawl to rebuild the cache from scratch. The shards use a valid cache as is, and
+        never write it, see the positions command.
+
+        :param workers: concurrent requests to list the prefixes (default 24)
+        :param range_digits: how many leading position digits to split each prefix by (default 1)
         """
 
-        for os_type, prefix in self.os_type.items():
-            print('Info: Get all the existed positions for {0}...'.format(os_type))
-            url = self.chromium_prefix_url_template.format(prefix)
-            next_page_token = self.__get_existed_positions_core(url, os_type, ini_start=True)
-            while next_page_token is not None:
-                url = self.chromium_prefix_url_with_token_template.format(prefix, next_page_token)
-                next_page_token = self.__get_existed_positions_core(url, os_type)
+        connection = self.open_positions_cache()
+        try:
+            listing_urls, full_crawl_os_types = self.prepare_existed_positions_urls(connection, range_digits)
+            pool = ThreadPoolExecutor(max_workers=workers)
+            futures = list()
+            for os_type, url in listing_urls:
+                futures.append(pool.submit(self.__list_existed_positions, os_type=os_type, url=url))
+            pool.shutdown(wait=True)
+            self.check_future_result(futures)
+            self.save_existed_positions(connection, full_crawl_os_types)
+        finally:
+            connection.close()
+
+    def build_existed_positions_index(self):
+        """Function: build_existed_positions_index
+
+        Build a sorted array of the existed positions per os type, so that the nearest position lookup could use bisect
+        """
+
+        for os_type, positions in self.chromium_existed_positions.items():
+            sorted_positions = sorted(int(position) for position in positions.keys() if position.isdigit())
+            self.chromium_existed_positions_index[os_type] = array('l', sorted_positions)
+
+    def get_nearest_position(self, os_type, position):
+        """Function: get_nearest_position
+
+        Find the existed position nearest to the given position, within [position-offset, position+offset].
+        When the left and right neighbours have the same distance, the right one wins.
+
+        :param os_type: the os type, such as mac, win, linux
+        :param position: the chromium base position
+        :return: the nearest existed position as str, or None if not found
+        """
+
+        positions = self.chromium_existed_positions_index.get(os_type)
+        if not positions:
+            return None
+        position = int(position)
+        index = bisect.bisect_left(positions, position)
+        candidates = list()
+        if index < len(positions):
+            candidates.append(positions[index])
+        if index > 0 and positions[index - 1] > 0:
+            candidates.append(positions[index - 1])
+        candidates = [candidate for candidate in candidates if abs(candidate - position) <= self.position_offset]
+        if not candidates:
+            return None
+        nearest_position = min(candidates, key=lambda candidate: (abs(candidate - position), -candidate))
+
+        return str(nearest_position)
+
+    def resume_checkpoint(self):
+        """Function: resume_checkpoint
+
+        Restore the versions, positions and download urls finished by an interrupted run
+        """
+
+        for stage, os_type, version, value in self.checkpoint.load():
+            if stage == 'versions':
+                self.chromium_versions.setdefault(os_type, {})[version] = value
+            elif stage == 'positions':
+                self.chromium_positions.setdefault(os_type, {})[version] = value
+            elif stage == 'download_urls':
+                self.chromium_downloads.setdefault(os_type, {})[version] = ChromiumRecord.from_dict(value['record'],
+                                                                                                    version)
+                self.chromium_download_items.setdefault(os_type, {})[version] = value['item']
+
+    def finish_stage(self, stage):
+        """Function: finish_stage
+
+        Mark the stage done in the checkpoint, only if none of its items failed. Otherwise the stage runs again on the
+        next run, for its failed items only, see iter_pending_items.
+        """
+
+        failures = self.checkpoint.get_failures(stage)
+        if failures > 0:
+            error_message = 'Error: {0} items of the {1} stage failed, ' \
+                            'they are retried by the next run'.format(failures, stage)
+            print(Fore.YELLOW + error_message)
+            return
+        self.checkpoint.done(stage)
+
+    def finish_checkpoint(self):
+        """Function: finish_checkpoint
+
+        Remove the checkpoint when the run finished and all its items are in the reports. If some items failed, keep
+        it, so the next run resumes from it and retries them.
+        """
+
+        if self.checkpoint.get_failures() > 0:
+            if self.checkpoint.enabled is True:
+                checkpoint_file = self.checkpoint.checkpoint_file
+                print('Info: Keep the checkpoint to retry the failed items: {0}'.format(checkpoint_file))
+            return
+        self.checkpoint.clear()
+
+    @staticmethod
+    def iter_pending_items(source, finished):
+        """Function: iter_pending_items
+
+        :param source: dict of os_type -> version -> value, the input of a stage
+        :param finished: dict of os_type -> version -> value, the output of the stage so far
+        :return: generator of (os_type, version, value) in the source, but not finished yet
+        """
+
+        for os_type, values in source.items():
+            finished_values = finished.get(os_type, {})
+            for version, value in values.items():
+                if version not in finished_values:
+                    yield os_type, version, value
 
     @staticmethod
     def check_future_result(futures):
@@ -133,16 +680,59 @@ class Chromium(object):
                 print(traceback.format_exc())
                 raise Exception('Error: Exception found {0}'.format(e))
 
-    def __process_difference(self, history_json_file, history_json_file_exists, releases):
-        """Private Function: __process_difference"""
+    def get_history_urls(self):
+        """Function: get_history_urls
 
-        if history_json_file_exists is False or self.force_crawl is True:
-            return releases
+        :return: list of (os_type, history.json url)
+        """
+
+        history_json_format = '{0}/history.json?channel={1}&os={2}'
+        history_urls = list()
+        for os_type in self.os_type.keys():
+            if os_type == 'linux64':
+                url = history_json_format.format(self.omahaproxy_host, self.channel, 'linux')
+            else:
+                url = history_json_format.format(self.omahaproxy_host, self.channel, os_type)
+            history_urls.append((os_type, url))
+
+        return history_urls
+
+    def process_chromium_versions(self, os_type, url, status_code, response_json):
+        """Function: process_chromium_versions
+
+        Diff the history.json response with the local history file by (os_type, version) and release fingerprint, and
+        collect the new or changed versions
+        """
+
+        if status_code != 200:
+            error_message = 'Fatal: Unexpected status code ' \
+                            'when requesting history url: {0}, {1}'.format(status_code, url)
+            print(Fore.RED + error_message)
+            sys.exit(1)
+        releases = response_json
+        history_store = HistoryStore(os_type, self.get_channel_file_path('{0}.history.json'.format(os_type)))
+        if self.force_crawl is True:
+            new_releases = releases
         else:
-            with open(history_json_file) as f:
-                existed_release = json.loads(f.read())
-            new_releases = [x for x in releases if x not in existed_release]
-            return new_releases
+            new_releases = history_store.diff(releases)
+        if not new_releases:
+            print('Info: No new release found for os type {0}'.format(os_type))
+            return
+        for release in new_releases:
+            try:
+                version = release['version']
+                if self.is_in_shard(os_type, version) is False:
+                    continue
+                self.chromium_versions.setdefault(os_type, {})[version] = list()
+                self.checkpoint.record('versions', os_type, version, list())
+            except KeyError:
+                pass
+        if self.shard is not None:
+            # The shards share the history file, it is saved by merge when all the shards are done
+            self.chromium_releases[os_type] = releases
+            return
+        # Save the history after the checkpoint, so the new versions are not lost if the crawl is interrupted
+        history_store.save(releases)
 
     def get_chromium_versions(self):
         """Function: get_chromium_versions
@@ -153,46 +743,17 @@ class Chromium(object):
         available os: max, win, win64, android
         """
 
-        print('Info: Start to get all chromium stable versions...')
-        history_json_format = '{0}/history.json?channel={1}&os={2}'
-        for os_type in self.os_type.keys():
-            if os_type == 'linux64':
-                url = history_json_format.format(self.omahaproxy_host, self.channel, 'linux')
-            else:
-                url = history_json_format.format(self.omahaproxy_host, self.channel, os_type)
+        print('Info: Start to get all chromium {0} versions...'.format(self.channel))
+        for os_type, url in self.get_history_urls():
             try:
-                res = self.session.get(url, timeout=self.time_out)
-                status_code = res.status_code
-                content = res.content
-                if status_code != 200:
-                    error_message = 'Fatal: Unexpected status code ' \
-                                      'when requesting history url: {0}, {1}'.format(status_code, url)
-                    print(Fore.RED + error_message)
-                    sys.exit(1)
-                releases = json.loads(content)
-                history_json_file = '{0}.history.json'.format(os_type)
-                history_json_file_exists = os.path.exists(history_json_file)
-                new_releases = self.__process_difference(history_json_file, history_json_file_exists, releases)
-                if not new_releases:
-                    print('Info: No new release found for os type {0}'.format(os_type))
-                    continue
-                if releases != new_releases:
-                    all_releases = releases + new_releases
-                else:
-                    all_releases = releases
-                with open(history_json_file, 'w+') as f:
-                    json.dump(all_releases, f, indent=4)
-                for release in new_releases:
-                    try:
-                        version = release['version']
-                        self.chromium_versions.setdefault(os_type, {})[version] = list()
-                    except KeyError:
-                        pass
+                status_code, response_json = self.fetch(url)
+                self.process_chromium_versions(os_type, url, status_code, response_json)
             except (requests.RequestException,
                     requests.exceptions.SSLError,
                     requests.packages.urllib3.exceptions.SSLError) as e:
                 error_message = 'Error: Unexpected error when requesting history url: {0}, {1}'.format(url, e)
                 print(Fore.RED + error_message)
+                self.checkpoint.fail('versions', os_type)
 
     def prepare_chromium_position_urls(self):
         """Function: get_chromium_position_urls
@@ -208,38 +769,47 @@ class Chromium(object):
                 value = {'position_url': url}
                 self.chromium_position_urls.setdefault(os_type, {})[version] = value
 
+    def process_chromium_position(self, os_type, version, position_url, status_code, response_json):
+        """Function: process_chromium_position
+
+        Get the chromium_base_position from the deps.json response
+        """
+
+        if status_code != 200:
+            error_message = 'Error: Unexpected status code ' \
+                            'when requesting position url: {0}, {1}'.format(status_code, position_url)
+            print(Fore.YELLOW + error_message)
+            self.checkpoint.fail('positions', os_type, version)
+        else:
+            try:
+                chromium_base_position = int(response_json['chromium_base_position'])
+                value = {'position_url': position_url, 'position': chromium_base_position}
+                self.chromium_positions.setdefault(os_type, {})[version] = value
+                self.checkpoint.record('positions', os_type, version, value)
+            except (KeyError, TypeError):
+                pass
+
     def __parallel_requests_to_get_positions(self, os_type, version, position_url):
         """Private Function: __parallel_requests_to_get_positions"""
 
         try:
-            res = self.session.get(position_url, timeout=self.time_out)
-            status_code = res.status_code
-            content = res.content
-            if status_code != 200:
-                error_message = 'Error: Unexpected status code ' \
-                                  'when requesting position url: {0}, {1}'.format(status_code, position_url)
-                print(Fore.YELLOW + error_message)
-            else:
-                position_json = json.loads(content)
-                try:
-                    chromium_base_position = int(position_json['chromium_base_position'])
-                    value = {'position_url': position_url, 'position': chromium_base_position}
-                    self.chromium_positions.setdefault(os_type, {})[version] = value
-                except (KeyError, TypeError):
-                    pass
-            time.sleep(5)
+            status_code, response_json = self.fetch(position_url)
+            self.process_chromium_position(os_type, version, position_url, status_code, response_json)
         except (requests.RequestException,
                 requests.exceptions.SSLError,
                 requests.packages.urllib3.exceptions.SSLError) as e:
             error_message = 'Error: Unexpected error when requesting position url: {0}, {1}'.format(position_url, e)
             print(Fore.RED + error_message)
+            self.checkpoint.fail('positions', os_type, version)
 
-    def get_chromium_positions(self, workers=3):
+    def get_chromium_positions(self, workers=10):
         """Function: get_chromium_positions
 
         Request the url https://omahaproxy.appspot.com/deps.json?version=77.0.3865.120 to get the base position.
 
-        :param workers: concurrent requests to get the positions (default 3)
+        The request rate to omahaproxy is limited by self.rate_limiter, not by the workers.
+
+        :param workers: concurrent requests to get the positions (default 10)
         """
 
         # # Only for test purpose
@@ -252,65 +822,177 @@ class Chromium(object):
         print('Info: Start to get all chromium positions...')
         pool = ThreadPoolExecutor(max_workers=workers)
         futures = list()
-        for os_type, values in self.chromium_position_urls.items():
-            for version, value in values.items():
-                position_url = value['position_url']
-                future = pool.submit(self.__parallel_requests_to_get_positions,
-                                     os_type=os_type,
-                                     version=version,
-                                     position_url=position_url)
-                futures.append(future)
+        for os_type, version, value in self.iter_pending_items(self.chromium_position_urls, self.chromium_positions):
+            position_url = value['position_url']
+            future = pool.submit(self.__parallel_requests_to_get_positions,
+                                 os_type=os_type,
+                                 version=version,
+                                 position_url=position_url)
+            futures.append(future)
         pool.shutdown(wait=True)
         self.check_future_result(futures)
 
+    def get_pending_prefix_keys(self, pending_items):
+        """Function: get_pending_prefix_keys
+
+        :param pending_items: list of (os_type, version, value) still to get the download url, see iter_pending_items
+        :return: set of (os_type, nearest existed position) whose prefix items are needed
+        """
+
+        keys = set()
+        for os_type, version, value in pending_items:
+            nearest_position = self.get_nearest_position(os_type, value['position'])
+            if nearest_position is not None:
+                keys.add((os_type, nearest_position))
+
+        return keys
+
+    def load_prefix_items_cache(self, keys, batch_size=500):
+        """Function: load_prefix_items_cache
+
+        Load the cached prefix listing items of the keys only, the ones already loaded, such as by the run of another
+        channel, are skipped. A snapshot never changes once uploaded, so the cache has no ttl, only
+        --refresh-positions skips it.
+
+        :param keys: set of (os_type, position), see get_pending_prefix_keys
+        :param batch_size: the positions per query, below the sqlite variables limit (default 500)
+        """
+
+        if self.refresh_positions is True:
+            return
+        positions_by_os_type = dict()
+        with self.prefix_items_lock:
+            for os_type, position in keys:
+                if (os_type, str(position)) not in self.prefix_items:
+                    positions_by_os_type.setdefault(os_type, list()).append(str(position))
+        if not positions_by_os_type:
+            return
+        connection = self.open_positions_cache()
+        try:
+            for os_type, positions in positions_by_os_type.items():
+                for i in range(0, len(positions), batch_size):
+                    batch = positions[i:i + batch_size]
+                    sql = 'SELECT position, items FROM prefix_items WHERE os_type = ? AND position IN ({0})'.format(
+                        ', '.join('?' * len(batch)))
+                    for position, items in connection.execute(sql, [os_type] + batch):
+                        self.prefix_items[(os_type, position)] = json.loads(items)
+        finally:
+            connection.close()
+
+    def save_prefix_items_cache(self):
+        """Function: save_prefix_items_cache"""
+
+        if not self.new_prefix_items:
+            return
+        connection = self.open_positions_cache()
+        try:
+            connection.executemany('INSERT OR REPLACE INTO prefix_items (os_type, position, items) VALUES (?, ?, ?)',
+                                   [(os_type, position, json.dumps(items))
+                                    for (os_type, position), items in self.new_prefix_items.items()])
+            connection.commit()
+        finally:
+            connection.close()
+        self.new_prefix_items.clear()
+
+    def get_prefix_items(self, os_type, position, prefix):
+        """Function: get_prefix_items
+
+        :return: the cached items of the prefix, or the item built from the only artifact rule of the os type if
+                 self.direct_urls, or None if the prefix has to be listed
+        """
+
+        items = self.prefix_items.get((os_type, str(position)))
+        if items is not None:
+            return items
+        file_names = self.artifact_rules.get(os_type, list())
+        if self.direct_urls is True and len(file_names) == 1:
+            name = prefix + file_names[0]
+            return [{'name': name, 'mediaLink': self.chromium_download_url_template.format(quote(name, safe=''))}]
+
+        return None
+
+    def select_artifact(self, os_type, items):
+        """Function: select_artifact
+
+        :return: the first item named by the artifact rules of the os type, or the largest item not filtered, or None
+        """
+
+        items_by_file_name = dict((item['name'].rsplit('/', 1)[-1], item) for item in items)
+        for file_name in self.artifact_rules.get(os_type, list()):
+            if file_name in items_by_file_name:
+                return items_by_file_name[file_name]
+        items = [item for item in items
+                 if all(filter_string not in item['name'] for filter_string in self.artifact_filter_strings)]
+        if not items:
+            return None
+
+        return max(items, key=lambda item: int(item['size']))
+
+    def set_download_item(self, os_type, version, position, value, url, items):
+        """Function: set_download_item
+
+        Pick the chromium archive from the prefix items, and record the download url
+        """
+
+        item = self.select_artifact(os_type, items)
+        if item is None:
+            error_message = 'Error: Failed to get the download url from prefix: {0}'.format(url)
+            print(Fore.RED + error_message)
+            return
+        record = ChromiumRecord.from_item(version, value, position, url, item)
+        self.chromium_downloads.setdefault(os_type, {})[version] = record
+        self.chromium_download_items.setdefault(os_type, {})[version] = item
+        self.checkpoint.record('download_urls', os_type, version, {'record': record.to_dict(), 'item': item})
+
+    def process_download_url(self, os_type, version, position, value, url, status_code, response_json):
+        """Function: process_download_url
+
+        Cache the items of the prefix listing response, and pick the chromium archive from them
+        """
+
+        if status_code != 200:
+            error_message = 'Error: Unexpected status code ' \
+                            'when requesting prefix url: {0}, {1}'.format(status_code, url)
+            print(Fore.RED + error_message)
+            self.checkpoint.fail('download_urls', os_type, version)
+            return
+        try:
+            items = response_json['items']
+        except KeyError:
+            error_message = 'Error: Failed to get the download url from prefix: {0}'.format(url)
+            print(Fore.RED + error_message)
+            return
+        with self.prefix_items_lock:
+            self.prefix_items[(os_type, str(position))] = items
+            self.new_prefix_items[(os_type, str(position))] = items
+        self.set_download_item(os_type, version, position, value, url, items)
+
     def __get_download_url(self, os_type, version, position, value):
         """Private Function: Ken"""
 
-        filter_strings = ['browser_tests', 'syms', 'shell', 'host', 'exe']
         prefix = self.chromium_existed_positions[os_type][position]
         url = self.chromium_prefix_url_template.format(prefix)
-        res = self.session.get(url, timeout=self.time_out)
-        status_code = res.status_code
-        if status_code != 200:
-            error_message = 'Error: Unexpected status code ' \
-                            'when requesting prefix url: {0}, {1}'.format(status_code, url)
+        items = self.get_prefix_items(os_type, position, prefix)
+        if items is not None:
+            self.set_download_item(os_type, version, position, value, url, items)
+            return
+        try:
+            status_code, response_json = self.fetch(self.chromium_prefix_listing_url_template.format(prefix))
+        except (requests.RequestException,
+                requests.exceptions.SSLError,
+                requests.packages.urllib3.exceptions.SSLError) as e:
+            error_message = 'Error: Unexpected error when requesting prefix url: {0}, {1}'.format(url, e)
             print(Fore.RED + error_message)
-        else:
-            content = json.loads(res.content)
-            try:
-                items = content['items']
-                items = [item for item in items
-                         if all(filter_string not in item['name'] for filter_string in filter_strings)]
-                sizes = [int(item['size']) for item in items]
-                index = sizes.index(max(sizes))
-                download_url = items[index]['mediaLink']
-                value['download_position'] = int(position)
-                value['download_prefix'] = url
-                value['download_url'] = download_url
-                self.chromium_downloads.setdefault(os_type, {})[version] = value
-            except KeyError:
-                error_message = 'Error: Failed to get the download url from prefix: {0}'.format(url)
-                print(Fore.RED + error_message)
+            self.checkpoint.fail('download_urls', os_type, version)
+            return
+        self.process_download_url(os_type, version, position, value, url, status_code, response_json)
 
     def __parallel_get_download_chromium_url(self, os_type, version, value, position):
         """Private Function: __parallel_requests_to_download_chromium"""
 
-        existed_positions_by_os_type = self.chromium_existed_positions[os_type].keys()
-        position = str(position)
-        if position in existed_positions_by_os_type:
-            self.__get_download_url(os_type, version, position, value)
-        else:
-            for i in range(1, self.position_offset + 1):
-                new_position_right = str(int(position) + i)
-                new_position_left = str(int(position) - i)
-                if int(new_position_left) <= 0:
-                    break
-                if new_position_right in existed_positions_by_os_type:
-                    self.__get_download_url(os_type, version, new_position_right, value)
-                    break
-                if new_position_left in existed_positions_by_os_type:
-                    self.__get_download_url(os_type, version, new_position_left, value)
-                    break
+        nearest_position = self.get_nearest_position(os_type, position)
+        if nearest_position is not None:
+            self.__get_download_url(os_type, version, nearest_position, value)
 
     def get_chromium_download_url(self, workers=100):
         """Function: chromium_download
@@ -324,78 +1006,426 @@ class Chromium(object):
         """
 
         print('Info: Start to get chromium urls...')
+        pending_items = list(self.iter_pending_items(self.chromium_positions, self.chromium_downloads))
+        self.load_prefix_items_cache(self.get_pending_prefix_keys(pending_items))
         pool = ThreadPoolExecutor(max_workers=workers)
         futures = list()
-        for os_type, values in self.chromium_positions.items():
-            for version, value in values.items():
-                position_url = value['position_url']
-                position = value['position']
-                value = {'position_url': position_url, 'position': position}
-                future = pool.submit(self.__parallel_get_download_chromium_url,
-                                     os_type=os_type,
-                                     version=version,
-                                     value=value,
-                                     position=position)
-                futures.append(future)
+        for os_type, version, value in pending_items:
+            position_url = value['position_url']
+            position = value['position']
+            value = {'position_url': position_url, 'position': position}
+            future = pool.submit(self.__parallel_get_download_chromium_url,
+                                 os_type=os_type,
+                                 version=version,
+                                 value=value,
+                                 position=position)
+            futures.append(future)
         pool.shutdown(wait=True)
+        self.save_prefix_items_cache()
         self.check_future_result(futures)
 
-    def report(self):
-        """Function: Report"""
+    def __iter_report(self, existed_chromium_downloads):
+        """Private Function: __iter_report
 
-        print('Info: Generating json/csv report...')
+        Merge the new records into the existed report without copying them. The new records win, so the versions
+        crawled again with changed records replace the existed ones, and the new versions come first, as before.
 
-        # Json report
-        json_report = 'chromium.stable.json'
-        json_report_exists = os.path.exists(json_report)
-        chromium_downloads = deepcopy(self.chromium_downloads)
-        if json_report_exists is True and self.force_crawl is False:
-            with open(json_report) as f:
-                existed_chromium_downloads = json.loads(f.read())
-                for os_type in self.os_type.keys():
-                    try:
-                        chromium_downloads[os_type].update(existed_chromium_downloads[os_type])
-                    except KeyError:
-                        chromium_downloads[os_type] = dict()
-                        chromium_downloads[os_type].update(existed_chromium_downloads[os_type])
-        with open(json_report, 'w+') as f:
-            json.dump(chromium_downloads, f, indent=4)
-
-        # CSV report
-        csv_report = 'chromium.stable.csv'
-        csv_rows = list()
-        headers = ['os', 'version', 'position_url', 'position', 'download_position', 'download_prefix', 'download_url']
-        csv_rows.append(headers)
-        for os_type, values in chromium_downloads.items():
+        :return: generator of (os_type, generator of (version, record))
+        """
+
+        os_types = list(self.chromium_downloads.keys())
+        if self.force_crawl is False:
+            os_types.extend(os_type for os_type in self.os_type.keys() if os_type not in self.chromium_downloads)
+
+        def iter_records(os_type):
+            new_values = self.chromium_downloads.get(os_type, {})
+            existed_values = existed_chromium_downloads.get(os_type, {})
+            for version, value in new_values.items():
+                yield version, value
+            for version, value in existed_values.items():
+                if version not in new_values:
+                    yield version, value
+
+        for os_type in os_types:
+            yield os_type, iter_records(os_type)
+
+    def get_report_delta(self, existed_chromium_downloads):
+        """Function: get_report_delta
+
+        :return: dict of os_type -> version -> record, the records not in the existed report yet, or different from
+                 the existed ones, such as a release crawled again after its history.json entry changed
+        """
+
+        delta = dict()
+        for os_type, values in self.chromium_downloads.items():
+            existed_values = existed_chromium_downloads.get(os_type, {})
             for version, value in values.items():
+                if version not in existed_values or self.is_same_record(value, existed_values[version]) is False:
+                    delta.setdefault(os_type, {})[version] = value
+
+        return delta
+
+    @staticmethod
+    def is_same_record(record, other_record):
+        """Function: is_same_record
+
+        :param record: dict or ChromiumRecord
+        :param other_record: dict or ChromiumRecord
+        :return: True if both records have the same fields and values
+        """
+
+        return dict(record.items()) == dict(other_record.items())
+
+    @staticmethod
+    def __iter_json_report(report, indent=4):
+        """Private Function: __iter_json_report
+
+        Stream the report as json.dump(report, indent=indent) does, or compact if indent is None
+        """
+
+        if indent is None:
+            newline, separator = '', ':'
+        else:
+            newline, separator = '\n', ': '
+        first_os_type = True
+        yield '{'
+        for os_type, records in report:
+            yield '{0}{1}{2}{3}{{'.format('' if first_os_type else ',',
+                                          newline, ' ' * (indent or 0), json.dumps(os_type) + separator)
+            first_os_type = False
+            first_version = True
+            for version, value in records:
+                if indent is None:
+                    record = json.dumps(value, separators=(',', ':'), default=ChromiumRecord.to_json)
+                else:
+                    record = json.dumps(value, indent=indent,
+                                        default=ChromiumRecord.to_json).replace('\n', '\n' + ' ' * indent * 2)
+                yield '{0}{1}{2}{3}{4}'.format('' if first_version else ',',
+                                               newline, ' ' * 2 * (indent or 0), json.dumps(version) + separator,
+                                               record)
+                first_version = False
+            yield '}' if first_version else '{0}{1}}}'.format(newline, ' ' * (indent or 0))
+        yield '}' if first_os_type else '{0}}}'.format(newline)
+
+    @staticmethod
+    def __iter_csv_rows(report):
+        """Private Function: __iter_csv_rows"""
+
+        yield ['os', 'version', 'position_url', 'position', 'download_position', 'download_prefix', 'download_url']
+        for os_type, records in report:
+            for version, value in records:
                 position_url = value['position_url']
                 position = value['position']
                 download_position = value['download_position']
                 download_prefix = value['download_prefix']
                 download_url = value['download_url']
-                csv_row = [os_type, version, position_url, position, download_position, download_prefix, download_url]
-                csv_rows.append(csv_row)
-        with open(csv_report, 'w+') as f:
-            csv_writer = csv.writer(f)
-            csv_writer.writerows(csv_rows)
+                yield [os_type, version, position_url, position, download_position, download_prefix, download_url]
 
-    def __chromium_download_core(self, os_type, version, download_url):
-        """Private Function: __chromium_download_core"""
+    @staticmethod
+    def __iter_ndjson_rows(report):
+        """Private Function: __iter_ndjson_rows"""
+
+        for os_type, records in report:
+            for version, value in records:
+                row = {'os': os_type, 'version': version}
+                row.update(value.items())
+                yield json.dumps(row, separators=(',', ':')) + '\n'
+
+    @staticmethod
+    def write_atomic(file_path, chunks):
+        """Function: write_atomic
+
+        Write the chunks to a temp file, and rename it to the file path, so a crash never leaves a partial report.
+        """
+
+        temp_file_path = '{0}.tmp'.format(file_path)
+        with open(temp_file_path, 'w') as f:
+            f.writelines(chunks)
+        os.replace(temp_file_path, file_path)
+
+    @staticmethod
+    def append_fsync(file_path, chunks):
+        """Function: append_fsync
+
+        Append the chunks to the file in place and fsync it, so the cost is the chunks, not the whole file.
+        A crash could leave a truncated last line, see is_stale_output.
+        """
+
+        with open(file_path, 'a') as f:
+            f.writelines(chunks)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def is_stale_output(file_path, source_mtime, terminator=None):
+        """Function: is_stale_output
+
+        The derived reports, such as chromium.<channel>.min.json, are only written when asked for. So they could miss
+        the records added to chromium.<channel>.json by the runs without them.
+
+        :param source_mtime: the mtime of chromium.<channel>.json before this run wrote it, None if it did not exist
+        :param terminator: the last byte of a complete file, such as b'\\n' (default None, not checked)
+        :return: True if the file is missing, older than the json report, or truncated, so it has to be rebuilt
+        """
+
+        if os.path.exists(file_path) is False:
+            return True
+        if source_mtime is not None and os.path.getmtime(file_path) < source_mtime:
+            return True
+        if terminator is not None and os.path.getsize(file_path) > 0:
+            with open(file_path, 'rb') as f:
+                f.seek(-len(terminator), os.SEEK_END)
+                if f.read() != terminator:
+                    return True
+
+        return False
+
+    def report(self, compact=False, ndjson=False):
+        """Function: Report
+
+        Merge the new records into chromium.<channel>.json/csv, streaming them to disk. If nothing is new or changed,
+        the existed reports are not rewritten.
+
+        Only the ndjson report and the index are updated incrementally. The existed chromium.<channel>.json is still
+        loaded in full, and the json, csv and min.json reports are rewritten in full whenever a record is new or
+        changed, so their cost grows with the whole report, not with the delta.
+
+        :param compact: also write chromium.<channel>.min.json, without indent (default False)
+        :param ndjson: also write chromium.<channel>.ndjson, one record per line, appending only the new records, and
+                       rewritten if a record changed (default False)
+
+        The min.json, ndjson and index reports are rebuilt if they are older than chromium.<channel>.json, see
+        is_stale_output.
+        """
+
+        print('Info: Generating {0} json/csv report...'.format(self.channel))
+
+        json_report = 'chromium.{0}.json'.format(self.channel)
+        csv_report = 'chromium.{0}.csv'.format(self.channel)
+        compact_report = 'chromium.{0}.min.json'.format(self.channel)
+        ndjson_report = 'chromium.{0}.ndjson'.format(self.channel)
+        index_report = 'chromium.{0}.db'.format(self.channel)
+        existed_chromium_downloads = dict()
+        json_report_exists = os.path.exists(json_report)
+        json_report_mtime = os.path.getmtime(json_report) if json_report_exists is True else None
+        compact_report_stale = self.is_stale_output(compact_report, json_report_mtime)
+        ndjson_report_stale = self.is_stale_output(ndjson_report, json_report_mtime, terminator=b'\n')
+        index_report_stale = self.is_stale_output(index_report, json_report_mtime)
+        if json_report_exists is True and self.force_crawl is False:
+            with open(json_report) as f:
+                existed_chromium_downloads = ChromiumRecord.loads(f.read())
+        delta = self.get_report_delta(existed_chromium_downloads)
+        # The changed records could not be appended to the ndjson report, their old lines have to be replaced
+        delta_changed = any(version in existed_chromium_downloads.get(os_type, {})
+                            for os_type, values in delta.items() for version in values.keys())
+        full_rewrite = json_report_exists is False or self.force_crawl is True
+        if not delta and full_rewrite is False:
+            print('Info: No new records, the reports are up to date')
+        else:
+            # Json report
+            self.write_atomic(json_report, self.__iter_json_report(self.__iter_report(existed_chromium_downloads)))
+
+            # CSV report
+            temp_csv_report = '{0}.tmp'.format(csv_report)
+            with open(temp_csv_report, 'w+') as f:
+                csv_writer = csv.writer(f)
+                csv_writer.writerows(self.__iter_csv_rows(self.__iter_report(existed_chromium_downloads)))
+            os.replace(temp_csv_report, csv_report)
+
+        # Compact json report
+        if compact is True and (delta or full_rewrite or compact_report_stale):
+            self.write_atomic(compact_report,
+                              self.__iter_json_report(self.__iter_report(existed_chromium_downloads), indent=None))
+
+        # NDJSON report
+        if ndjson is True:
+            if full_rewrite is True or ndjson_report_stale is True or delta_changed is True:
+                self.write_atomic(ndjson_report,
+                                  self.__iter_ndjson_rows(self.__iter_report(existed_chromium_downloads)))
+            elif delta:
+                self.append_fsync(ndjson_report,
+                                  self.__iter_ndjson_rows((os_type, values.items())
+                                                          for os_type, values in delta.items()))
+
+        # Index report, see: chromium.py lookup
+        chromium_index = ChromiumIndex(index_report)
+        if full_rewrite is True or index_report_stale is True or chromium_index.is_valid() is False:
+            chromium_index.build(dict((os_type, dict(records))
+                                      for os_type, records in self.__iter_report(existed_chromium_downloads)))
+        elif delta:
+            chromium_index.update(delta)
+
+    def shard_report(self):
+        """Function: shard_report
+
+        Write the records of this shard to the partial report chromium.<channel>.shard-<i>-of-<N>.json, see merge
+        """
+
+        partial_report = self.get_shard_file_path('chromium.{0}.json'.format(self.channel))
+        print('Info: Generating the partial report {0}...'.format(partial_report))
+        report = {'shard': self.shard,
+                  'channel': self.channel,
+                  'force_crawl': self.force_crawl,
+                  'releases': self.chromium_releases,
+                  'records': self.chromium_downloads,
+                  'items': self.chromium_download_items}
+        self.write_atomic(partial_report, [json.dumps(report, indent=4, default=ChromiumRecord.to_json)])
+
+    def merge(self, partial_reports, compact=False, ndjson=False):
+        """Function: merge
+
+        Merge the partial reports of all the shards into chromium.<channel>.json/csv, and save the history files
+
+        :param partial_reports: the chromium.<channel>.shard-<i>-of-<N>.json files of one channel, one per shard
+        :param compact: see report(compact) (default False)
+        :param ndjson: see report(ndjson) (default False)
+        """
+
+        shards = dict()
+        for partial_report in partial_reports:
+            with open(partial_report) as f:
+                partial = ChromiumRecord.loads(f.read())
+            index, count = partial['shard']
+            if index in shards:
+                raise Exception('Error: Duplicated shard {0}/{1}: {2}'.format(index, count, partial_report))
+            shards[index] = partial
+        counts = set(partial['shard'][1] for partial in shards.values())
+        if len(counts) != 1:
+            raise Exception('Error: The partial reports are from different shard counts: {0}'.format(sorted(counts)))
+        count = counts.pop()
+        channels = set(partial['channel'] for partial in shards.values())
+        if len(channels) != 1:
+            raise Exception('Error: The partial reports are from different channels: {0}'.format(sorted(channels)))
+        self.channel = channels.pop()
+        missing = [str(index) for index in range(count) if index not in shards]
+        if missing:
+            raise Exception('Error: Missing the partial reports of the shards: {0} of {1}'.format(', '.join(missing),
+                                                                                                   count))
+        print('Info: Merge the partial reports of {0} shards...'.format(count))
+        self.force_crawl = any(partial['force_crawl'] for partial in shards.values())
+        for index in range(count):
+            partial = shards[index]
+            for os_type, values in partial['records'].items():
+                self.chromium_downloads.setdefault(os_type, {}).update(values)
+            for os_type, values in partial['items'].items():
+                self.chromium_download_items.setdefault(os_type, {}).update(values)
+            for os_type, releases in partial['releases'].items():
+                self.chromium_releases.setdefault(os_type, releases)
+        self.report(compact=compact, ndjson=ndjson)
+        # All the shards saw the same history.json, save it once the records are in the reports
+        for os_type, releases in self.chromium_releases.items():
+            HistoryStore(os_type, self.get_channel_file_path('{0}.history.json'.format(os_type))).save(releases)
+
+    @staticmethod
+    def get_chromium_file_path(os_type, version):
+        """Function: get_chromium_file_path
+
+        :return: the path to save the chromium, Downloads/<os_type>/<version>/chrome.zip
+        """
 
         cur_dir = os.getcwd()
         chromium_save_dir = os.path.join(cur_dir, 'Downloads', os_type, version)
         chromium_save_dir_exist_status = os.path.exists(chromium_save_dir)
         if chromium_save_dir_exist_status is False:
             os.makedirs(chromium_save_dir)
-        chromium_file_path = os.path.join(chromium_save_dir, 'chrome.zip')
-        print('Info: Starting downloading {0}...'.format(chromium_file_path))
+
+        return os.path.join(chromium_save_dir, 'chrome.zip')
+
+    def get_download_metadata(self, os_type, version):
+        """Function: get_download_metadata
+
+        :return: (size, md5Hash) of the archive from the prefix listing, None if unknown
+        """
+
+        item = self.chromium_download_items.get(os_type, {}).get(version, {})
+
+        return item.get('size'), item.get('md5Hash')
+
+    @staticmethod
+    def get_store_key(download_url):
+        """Function: get_store_key
+
+        :return: (object name, generation) of the download url, such as ('Mac/722274/chrome-mac.zip', '1575589468')
+        """
+
+        url = urlparse(download_url)
+        name = unquote(url.path.split('/o/', 1)[-1])
+        generation = parse_qs(url.query).get('generation', ['0'])[0]
+
+        return name, generation
+
+    @staticmethod
+    def get_store_path(name, generation):
+        """Function: get_store_path
+
+        :return: the content addressed path, Downloads/.store/<name dir>/<generation>/<name file>
+        """
+
+        object_dir, object_file = os.path.split(name)
+        store_dir = os.path.join(os.getcwd(), 'Downloads', '.store', *(object_dir.split('/') + [generation]))
+        if os.path.exists(store_dir) is False:
+            os.makedirs(store_dir)
+
+        return os.path.join(store_dir, object_file)
+
+    @staticmethod
+    def link_chromium_file(store_path, chromium_file_path):
+        """Function: link_chromium_file
+
+        Link the version path to the stored archive: hardlink, or symlink, or copy if the file system supports neither
+        """
+
+        if os.path.exists(chromium_file_path):
+            if os.path.samefile(store_path, chromium_file_path):
+                return
+            os.remove(chromium_file_path)
         try:
-            with self.session.get(download_url, stream=True) as r:
-                with open(chromium_file_path, 'wb') as f:
-                    shutil.copyfileobj(r.raw, f)
+            os.link(store_path, chromium_file_path)
+        except (OSError, AttributeError):
+            try:
+                os.symlink(os.path.relpath(store_path, os.path.dirname(chromium_file_path)), chromium_file_path)
+            except (OSError, AttributeError, NotImplementedError):
+                shutil.copyfile(store_path, chromium_file_path)
+
+    def group_chromium_downloads(self):
+        """Function: group_chromium_downloads
+
+        Group the versions by the archive they point to, so each archive is downloaded once.
+
+        :return: dict of store path -> {'download_url', 'size', 'md5', 'chromium_file_paths'}
+        """
+
+        groups = dict()
+        for os_type, values in self.chromium_downloads.items():
+            for version, value in values.items():
+                download_url = value['download_url']
+                store_path = self.get_store_path(*self.get_store_key(download_url))
+                size, md5 = self.get_download_metadata(os_type, version)
+                group = groups.setdefault(store_path, {'download_url': download_url,
+                                                       'size': None,
+                                                       'md5': None,
+                                                       'chromium_file_paths': list()})
+                group['size'] = group['size'] or size
+                group['md5'] = group['md5'] or md5
+                group['chromium_file_paths'].append(self.get_chromium_file_path(os_type, version))
+
+        return groups
+
+    def __chromium_download_core(self, store_path, download_url, size, md5, chromium_file_paths):
+        """Private Function: __chromium_download_core"""
+
+        print('Info: Starting downloading {0}...'.format(store_path))
+        try:
+            if self.downloader.download(download_url, store_path, size=size, md5=md5) is False:
+                error_message = 'Error: Size or md5 mismatch when downloading: {0}'.format(download_url)
+                print(Fore.RED + error_message)
+                return
+            for chromium_file_path in chromium_file_paths:
+                self.link_chromium_file(store_path, chromium_file_path)
         except (requests.RequestException,
                 requests.exceptions.SSLError,
-                requests.packages.urllib3.exceptions.SSLError) as e:
+                requests.packages.urllib3.exceptions.SSLError,
+                DownloadError) as e:
             error_message = 'Error: Unexpected error ' \
                             'when requesting download url: {0}, {1}'.format(download_url, e)
             print(Fore.RED + error_message)
@@ -403,7 +1433,13 @@ class Chromium(object):
     def chromium_download(self, workers=10):
         """Function: chromium_download
 
-        :param workers: how many concurrent requests to download chromium (default 3)
+        The archives are resumed from their .part files, split into parallel ranges, and verified against the size and
+        md5 of the prefix listing. The verified archives are skipped.
+
+        Each archive (object name + generation) is downloaded once to Downloads/.store, and
+        Downloads/<os_type>/<version>/chrome.zip are linked to it.
+
+        :param workers: how many concurrent requests to download chromium (default 10)
         """
 
         # # Only for test purpose
@@ -423,30 +1459,255 @@ class Chromium(object):
         print('Info: Start to download chromium...')
         pool = ThreadPoolExecutor(max_workers=workers)
         futures = list()
-        for os_type, values in self.chromium_downloads.items():
-            for version, value in values.items():
-                download_url = value['download_url']
-                future = pool.submit(self.__chromium_download_core,
-                                     os_type=os_type,
-                                     version=version,
-                                     download_url=download_url)
-                futures.append(future)
+        for store_path, group in self.group_chromium_downloads().items():
+            future = pool.submit(self.__chromium_download_core,
+                                 store_path=store_path,
+                                 download_url=group['download_url'],
+                                 size=group['size'],
+                                 md5=group['md5'],
+                                 chromium_file_paths=group['chromium_file_paths'])
+            futures.append(future)
         pool.shutdown(wait=True)
         self.check_future_result(futures)
 
+    def run(self, download=False, compact_report=False, ndjson_report=False, workers=None):
+        """Function: run
+
+        Run the whole pipeline: versions -> existed positions -> positions -> download urls -> report (-> download)
+        Run several channels one after another with share_resources, see run_channels.
+        The finished stages and items are journaled to self.checkpoint, so an interrupted run resumes from them.
+        With self.shard, only the versions of the shard are crawled, and the partial report is written instead.
+
+        :param download: download all the chromium after the report (default False)
+        :param compact_report: see report(compact) (default False)
+        :param ndjson_report: see report(ndjson) (default False)
+        :param workers: the workers of every stage, such as for benchmark.py (default None, the default of each stage)
+        """
+
+        stage_kwargs = dict() if workers is None else dict(workers=int(workers))
+        self.resume_checkpoint()
+        if self.checkpoint.is_done('versions') is False:
+            with self.metrics.stage('versions'):
+                self.get_chromium_versions()
+            self.finish_stage('versions')
+        # Already listed if shared from the run of another channel, see share_resources
+        if not self.chromium_existed_positions_index:
+            with self.metrics.stage('existed_positions'):
+                self.get_existed_positions(**stage_kwargs)
+        self.prepare_chromium_position_urls()
+        if self.checkpoint.is_done('positions') is False:
+            with self.metrics.stage('positions'):
+                self.get_chromium_positions(**stage_kwargs)
+            self.finish_stage('positions')
+        if self.checkpoint.is_done('download_urls') is False:
+            with self.metrics.stage('download_urls'):
+                self.get_chromium_download_url(**stage_kwargs)
+            self.finish_stage('download_urls')
+        self.report_coalesced_requests()
+        with self.metrics.stage('report'):
+            if self.shard is not None:
+                self.shard_report()
+            else:
+                self.report(compact=compact_report, ndjson=ndjson_report)
+        # All the results are in the reports now, the next run starts over, unless some items failed
+        self.finish_checkpoint()
+        if download is True:
+            with self.metrics.stage('download'):
+                self.chromium_download(**stage_kwargs)
+        self.write_metrics()
+
+
+def run_channels(crawler, channels, download=False, compact_report=False, ndjson_report=False, **kwargs):
+    """Function: run_channels
+
+    Crawl the channels one after another in one invocation. The later channels share the resources of the first one,
+    see Chromium.share_resources, and write their own chromium.<channel>.json/csv.
+
+    :param crawler: the class, Chromium or AsyncChromium
+    :param channels: list of channels, such as ['stable', 'beta']
+    :param kwargs: the other arguments of the crawler
+    """
+
+    first = None
+    for channel in channels:
+        chromium = crawler(channel=channel, **kwargs)
+        if first is None:
+            first = chromium
+        else:
+            chromium.share_resources(first)
+        chromium.run(download=download, compact_report=compact_report, ndjson_report=ndjson_report)
+
+
+def group_partial_reports(partial_reports):
+    """Function: group_partial_reports
+
+    :return: dict of channel -> the partial reports of the channel
+    """
+
+    groups = dict()
+    for partial_report in partial_reports:
+        with open(partial_report) as f:
+            channel = json.loads(f.read())['channel']
+        groups.setdefault(channel, list()).append(partial_report)
+
+    return groups
+
+
+def load_artifact_rules(artifact_rules_file=None):
+    """Function: load_artifact_rules
+
+    :return: dict of os_type -> list of archive file names from the json file, or None if not provided
+    """
+
+    if artifact_rules_file is None:
+        return None
+    with open(artifact_rules_file) as f:
+        artifact_rules = json.loads(f.read())
+    for os_type, file_names in artifact_rules.items():
+        if isinstance(file_names, list) is False:
+            raise Exception('Error: The artifact rule of {0} should be a list of file names'.format(os_type))
+
+    return artifact_rules
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Crawl the chromium...')
     parser.add_argument('-f', '--force', nargs='?', default=False, const=False,
                         help='Force crawl all. Default: False')
+    parser.add_argument('-c', '--channels', default='stable',
+                        help='Comma separated channels: stable, beta, dev, canary. Each channel writes '
+                             'chromium.<channel>.json/csv, and shares the listings with the others. Default: stable')
+    parser.add_argument('-o', '--offset', type=int, default=100,
+                        help='Search the nearest position within [position-offset, position+offset]. Default: 100')
+    parser.add_argument('--positions-cache', default='chromium.positions.db',
+                        help='The sqlite file to cache the existed positions. Default: chromium.positions.db')
+    parser.add_argument('--positions-cache-ttl', type=int, default=604800,
+                        help='Seconds before the positions cache is fully rebuilt. Default: 604800')
+    parser.add_argument('--refresh-positions', nargs='?', default=False, const=True,
+                        help='Rebuild the positions cache from scratch. Default: False')
+    parser.add_argument('--omahaproxy-host', default='https://omahaproxy.appspot.com',
+                        help='The omahaproxy host. Default: https://omahaproxy.appspot.com')
+    parser.add_argument('--googleapis-host', default='https://www.googleapis.com',
+                        help='The googleapis host. Default: https://www.googleapis.com')
+    parser.add_argument('-e', '--engine', choices=['thread', 'async'], default='thread',
+                        help='thread: ThreadPoolExecutor + requests, async: asyncio + aiohttp. Default: thread')
+    parser.add_argument('--download', nargs='?', default=False, const=True,
+                        help='Download all the chromium after the report. Default: False')
+    parser.add_argument('--omahaproxy-rate', type=float, default=2,
+                        help='Requests per second to the omahaproxy host, adapts to 429/503. Default: 2')
+    parser.add_argument('--googleapis-rate', type=float, default=50,
+                        help='Requests per second to the googleapis host, adapts to 429/503. Default: 50')
+    parser.add_argument('--omahaproxy-concurrency', type=int, default=3,
+                        help='Max concurrent requests to the omahaproxy host, --engine async only. Default: 3')
+    parser.add_argument('--googleapis-concurrency', type=int, default=100,
+                        help='Max concurrent requests to the googleapis host, --engine async only. Default: 100')
+    parser.add_argument('--download-chunks', type=int, default=4,
+                        help='How many ranges of one archive to download in parallel. Default: 4')
+    subparsers = parser.add_subparsers(dest='command')
+    lookup_parser = subparsers.add_parser('lookup', help='Query chromium.stable.db, instead of crawling')
+    lookup_parser.add_argument('version', nargs='?',
+                               help='The exact version such as 77.0.3865.120, or a version prefix such as 77.*')
+    lookup_parser.add_argument('--os', dest='os_type', default=None,
+                               help='mac, win, win64, linux, linux64, android. Default: all')
+    lookup_parser.add_argument('--nearest', type=int, default=None, metavar='POSITION',
+                               help='Find the versions with the nearest download position, requires --os')
+    lookup_parser.add_argument('--index', default='chromium.stable.db',
+                               help='The index file. Default: chromium.stable.db')
+    lookup_parser.add_argument('--rebuild', default=None, metavar='JSON_REPORT',
+                               help='Rebuild the index from the json report first, such as chromium.stable.json')
+    merge_parser = subparsers.add_parser('merge', help='Merge the partial reports of --shard into the reports')
+    merge_parser.add_argument('partial_reports', nargs='+', metavar='PARTIAL_REPORT',
+                              help='The partial reports of all the shards, such as chromium.stable.shard-*-of-4.json')
+    subparsers.add_parser('positions', help='Only list the existed positions into --positions-cache, once before the '
+                                            '--shard runs, which read it even with --force')
+    parser.add_argument('--compact-report', nargs='?', default=False, const=True,
+                        help='Also write chromium.stable.min.json without indent. Default: False')
+    parser.add_argument('--ndjson-report', nargs='?', default=False, const=True,
+                        help='Also write chromium.stable.ndjson, one record per line. Default: False')
+    parser.add_argument('--checkpoint', default='chromium.checkpoint.ndjson',
+                        help='The journal to resume an interrupted crawl from. Default: chromium.checkpoint.ndjson')
+    parser.add_argument('--no-checkpoint', action='store_true',
+                        help='Disable the checkpoint journal')
+    parser.add_argument('--metrics', default=None, metavar='METRICS_FILE',
+                        help='Write the request and stage metrics of the run, prometheus text format if the file '
+                             'ends with .prom or .txt, otherwise json. Default: not written')
+    parser.add_argument('--profile', default=None, metavar='PROFILE_FILE',
+                        help='cProfile the run and dump the stats, see: python -m pstats PROFILE_FILE. '
+                             'Default: not profiled')
+    parser.add_argument('--artifact-rules', default=None, metavar='JSON_FILE',
+                        help='The archive file names of each os type, the first one found wins, such as '
+                             '{"win": ["chrome-win.zip"]}. Default: chrome-<os>.zip, and chrome-win32.zip for win')
+    parser.add_argument('--direct-urls', nargs='?', default=False, const=True,
+                        help='Build the download url from the artifact rule instead of listing the prefix, '
+                             'for the os types with one file name. The url has no generation. Default: False')
+    parser.add_argument('--shard', default=None, metavar='i/N',
+                        help='Crawl only the i-th of N partitions of the versions, and write a partial report '
+                             'to merge. Default: not sharded')
     args = parser.parse_args()
-    chromium = Chromium(fore_crawl=args.force)
-    chromium.get_chromium_versions()
-    chromium.get_existed_positions()
-    chromium.prepare_chromium_position_urls()
-    chromium.get_chromium_positions()
-    chromium.get_chromium_download_url()
-    chromium.report()
+    if args.command == 'lookup':
+        chromium_index = ChromiumIndex(args.index)
+        if args.rebuild is not None:
+            if os.path.exists(args.rebuild) is False:
+                print(Fore.RED + 'Error: Json report not found: {0}'.format(args.rebuild))
+                sys.exit(1)
+            chromium_index.build_from_json(args.rebuild)
+        if chromium_index.is_valid() is False:
+            print(Fore.RED + 'Error: Index not found or outdated: {0}, please build it first with: '
+                             'lookup --rebuild chromium.stable.json'.format(args.index))
+            sys.exit(1)
+        if args.nearest is not None:
+            if args.os_type is None:
+                lookup_parser.error('--nearest requires --os')
+            records = chromium_index.nearest(args.nearest, args.os_type)
+        elif args.version is not None:
+            records = chromium_index.lookup(args.version, args.os_type)
+        else:
+            records = list()
+        for record in records:
+            print(json.dumps(record))
+        sys.exit(0 if records else 1)
+    if args.command == 'merge':
+        for merge_channel, merge_partial_reports in group_partial_reports(args.partial_reports).items():
+            Chromium(channel=merge_channel, checkpoint_file=None).merge(
+                merge_partial_reports,
+                compact=Chromium.validate_boole(args.compact_report),
+                ndjson=Chromium.validate_boole(args.ndjson_report))
+        sys.exit(0)
+    crawler_kwargs = dict(fore_crawl=args.force,
+                          omahaproxy_host=args.omahaproxy_host,
+                          googleapis_host=args.googleapis_host,
+                          position_offset=args.offset,
+                          positions_cache=args.positions_cache,
+                          positions_cache_ttl=args.positions_cache_ttl,
+                          refresh_positions=args.refresh_positions,
+                          omahaproxy_rate=args.omahaproxy_rate,
+                          googleapis_rate=args.googleapis_rate,
+                          download_chunks=args.download_chunks,
+                          metrics_file=args.metrics,
+                          artifact_rules=load_artifact_rules(args.artifact_rules),
+                          direct_urls=args.direct_urls)
+    if args.command == 'positions':
+        positions_chromium = Chromium(checkpoint_file=None, **crawler_kwargs)
+        with positions_chromium.metrics.stage('existed_positions'):
+            positions_chromium.get_existed_positions()
+        positions_chromium.write_metrics()
+        sys.exit(0)
+    engine_kwargs = dict()
+    if args.engine == 'async':
+        from chromium_async import AsyncChromium as Crawler
+        engine_kwargs = dict(omahaproxy_concurrency=args.omahaproxy_concurrency,
+                             googleapis_concurrency=args.googleapis_concurrency)
+    else:
+        Crawler = Chromium
+    crawler_kwargs.update(engine_kwargs)
     # Download takes time, and not necessary to download all to git
     # Find the chromium.stable.json, chromium.stable.csv to get all download links
-    # chromium.chromium_download()
+    with Metrics.profile(args.profile):
+        run_channels(Crawler,
+                     channels=[channel.strip() for channel in args.channels.split(',') if channel.strip()],
+                     download=Chromium.validate_boole(args.download),
+                     compact_report=Chromium.validate_boole(args.compact_report),
+                     ndjson_report=Chromium.validate_boole(args.ndjson_report),
+                     checkpoint_file=None if args.no_checkpoint else args.checkpoint,
+                     shard=args.shard,
+                     **crawler_kwargs)
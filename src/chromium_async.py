@@ -0,0 +1,379 @@
+from urllib.parse import urlparse
+from downloader import DownloadError
+from chromium import Chromium
+from colorama import Fore
+import asyncio
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncChromium(Chromium):
+    """Download all the chromium old stable versions, with one asyncio event loop and one aiohttp connection pool"""
+
+    def __init__(self, omahaproxy_concurrency=3, googleapis_concurrency=100, host_limits=None, **kwargs):
+        """
+        :param omahaproxy_concurrency: max concurrent requests to the omahaproxy host (default 3)
+        :param googleapis_concurrency: max concurrent requests to the googleapis host (default 100)
+        :param host_limits: dict of host -> max concurrent requests, overrides the above
+        :param kwargs: see Chromium
+        """
+
+        if aiohttp is None:
+            raise Exception('Error: The async engine requires aiohttp, please run: pip install aiohttp')
+        super(AsyncChromium, self).__init__(**kwargs)
+        self.host_limits = {urlparse(self.omahaproxy_host).netloc: int(omahaproxy_concurrency),
+                            urlparse(self.googleapis_host).netloc: int(googleapis_concurrency)}
+        self.host_limits.update(host_limits or dict())
+        self.default_host_limit = 10
+        self.client = None
+        self.host_semaphores = dict()
+
+    def __get_host_semaphore(self, url):
+        """Private Function: __get_host_semaphore"""
+
+        host = urlparse(url).netloc
+        if host not in self.host_semaphores:
+            limit = self.host_limits.get(host, self.default_host_limit)
+            self.host_semaphores[host] = asyncio.Semaphore(limit)
+
+        return self.host_semaphores[host]
+
+    async def acquire(self, url):
+        """Function: acquire
+
+        Wait for the shared rate limiter of the url host
+        """
+
+        wait = self.rate_limiter.reserve(urlparse(url).netloc)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def stage(self, name, coroutine):
+        """Function: stage
+
+        Await the coroutine, recording its wall time as the stage, see Metrics.stage
+        """
+
+        with self.metrics.stage(name):
+            return await coroutine
+
+    async def fetch(self, url):
+        """Function: fetch
+
+        GET the url once per run, see Chromium.fetch
+
+        :return: (status_code, the parsed json of the 200 response, or None)
+        """
+
+        future = self.coalesced_requests.get(url)
+        if future is None:
+            future = asyncio.ensure_future(self.fetch_json(url))
+            self.coalesced_requests[url] = future
+        else:
+            self.coalesced_requests_saved += 1
+
+        return await asyncio.shield(future)
+
+    async def fetch_json(self, url):
+        """Function: fetch_json
+
+        :return: (status_code, the parsed json of the 200 response, or None), the body is not kept
+        """
+
+        status_code, content = await self.fetch_core(url)
+
+        return self.parse_response(status_code, content)
+
+    async def fetch_core(self, url):
+        """Function: fetch_core
+
+        GET the url with the same retry policy as Chromium.request: retry the status_forcelist and the connection
+        errors up to retry_total times, sleeping backoff_factor * 2 ** (retry - 1) in between.
+        Every attempt goes through the shared rate limiter.
+
+        :return: (status_code, content)
+        """
+
+        host = urlparse(url).netloc
+        semaphore = self.__get_host_semaphore(url)
+        retry = 0
+        start_time = time.time()
+        while True:
+            try:
+                await self.acquire(url)
+                async with semaphore:
+                    async with self.client.get(url) as res:
+                        status_code = res.status
+                        content = await res.read()
+                        self.rate_limiter.feedback(host, status_code, res.headers.get('Retry-After'))
+                if status_code not in self.status_forcelist or retry >= self.retry_total:
+                    self.metrics.observe_request(host, status_code, time.time() - start_time, retry, len(content))
+                    return status_code, content
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if retry >= self.retry_total:
+                    self.metrics.observe_request(host, 'error', time.time() - start_time, retry)
+                    raise
+            retry += 1
+            if retry > 1:
+                await asyncio.sleep(self.backoff_factor * (2 ** (retry - 1)))
+
+    async def __get_chromium_versions_core(self, os_type, url):
+        """Private Function: __get_chromium_versions_core"""
+
+        try:
+            status_code, response_json = await self.fetch(url)
+            self.process_chromium_versions(os_type, url, status_code, response_json)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error_message = 'Error: Unexpected error when requesting history url: {0}, {1}'.format(url, e)
+            print(Fore.RED + error_message)
+            self.checkpoint.fail('versions', os_type)
+
+    async def async_get_chromium_versions(self):
+        """Function: async_get_chromium_versions"""
+
+        print('Info: Start to get all chromium {0} versions...'.format(self.channel))
+        await asyncio.gather(*[self.__get_chromium_versions_core(os_type, url)
+                               for os_type, url in self.get_history_urls()])
+
+    async def __list_existed_positions(self, os_type, url):
+        """Private Function: __list_existed_positions"""
+
+        page_url = url
+        while True:
+            try:
+                status_code, content = await self.fetch_core(page_url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error_message = 'Error: Unexpected error when requesting prefix url: {0}, {1}'.format(page_url, e)
+                print(Fore.RED + error_message)
+                self.failed_listing_os_types.add(os_type)
+                return
+            next_page_token = self.process_existed_positions(os_type, page_url, status_code, content)
+            if next_page_token is None:
+                return
+            page_url = '{0}&pageToken={1}'.format(url, next_page_token)
+
+    async def async_get_existed_positions(self, range_digits=1):
+        """Function: async_get_existed_positions
+
+        See Chromium.get_existed_positions
+        """
+
+        connection = self.open_positions_cache()
+        try:
+            listing_urls, full_crawl_os_types = self.prepare_existed_positions_urls(connection, range_digits)
+            await asyncio.gather(*[self.__list_existed_positions(os_type, url) for os_type, url in listing_urls])
+            self.save_existed_positions(connection, full_crawl_os_types)
+        finally:
+            connection.close()
+
+    async def __get_chromium_position_core(self, os_type, version, position_url):
+        """Private Function: __get_chromium_position_core"""
+
+        try:
+            status_code, response_json = await self.fetch(position_url)
+            self.process_chromium_position(os_type, version, position_url, status_code, response_json)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error_message = 'Error: Unexpected error when requesting position url: {0}, {1}'.format(position_url, e)
+            print(Fore.RED + error_message)
+            self.checkpoint.fail('positions', os_type, version)
+
+    async def async_get_chromium_positions(self):
+        """Function: async_get_chromium_positions"""
+
+        print('Info: Start to get all chromium positions...')
+        await asyncio.gather(*[self.__get_chromium_position_core(os_type, version, value['position_url'])
+                               for os_type, version, value in self.iter_pending_items(self.chromium_position_urls,
+                                                                                      self.chromium_positions)])
+
+    async def __get_download_url_core(self, os_type, version, position_url, position):
+        """Private Function: __get_download_url_core"""
+
+        nearest_position = self.get_nearest_position(os_type, position)
+        if nearest_position is None:
+            return
+        value = {'position_url': position_url, 'position': position}
+        prefix = self.chromium_existed_positions[os_type][nearest_position]
+        url = self.chromium_prefix_url_template.format(prefix)
+        items = self.get_prefix_items(os_type, nearest_position, prefix)
+        if items is not None:
+            self.set_download_item(os_type, version, nearest_position, value, url, items)
+            return
+        try:
+            status_code, response_json = await self.fetch(self.chromium_prefix_listing_url_template.format(prefix))
+            self.process_download_url(os_type, version, nearest_position, value, url, status_code, response_json)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error_message = 'Error: Unexpected error when requesting prefix url: {0}, {1}'.format(url, e)
+            print(Fore.RED + error_message)
+            self.checkpoint.fail('download_urls', os_type, version)
+
+    async def async_get_chromium_download_url(self):
+        """Function: async_get_chromium_download_url"""
+
+        print('Info: Start to get chromium urls...')
+        pending_items = list(self.iter_pending_items(self.chromium_positions, self.chromium_downloads))
+        self.load_prefix_items_cache(self.get_pending_prefix_keys(pending_items))
+        await asyncio.gather(*[self.__get_download_url_core(os_type, version, value['position_url'], value['position'])
+                               for os_type, version, value in pending_items])
+        self.save_prefix_items_cache()
+
+    async def __download_chunk(self, url, start, end, part_path, single):
+        """Private Function: __download_chunk
+
+        See Downloader.download_chunk
+        """
+
+        for retry in range(self.downloader.retries + 1):
+            if retry > 0:
+                print('Info: Resume the interrupted download ({0}/{1}): {2}'.format(retry, self.downloader.retries,
+                                                                                   part_path))
+            if await self.__download_range(url, start, end, part_path, single) is True:
+                return
+        raise DownloadError('Error: The connection dropped {0} times when downloading: {1}'.format(
+            self.downloader.retries + 1, url))
+
+    async def __download_range(self, url, start, end, part_path, single):
+        """Private Function: __download_range
+
+        See Downloader.download_range
+        """
+
+        offset = self.downloader.get_part_offset(part_path)
+        if end is not None and start + offset > end:
+            return True
+        headers = dict()
+        range_header = self.downloader.get_range_header(start, end, offset)
+        if range_header is not None:
+            headers['Range'] = range_header
+        await self.acquire(url)
+        host = urlparse(url).netloc
+        async with self.__get_host_semaphore(url):
+            start_time = time.time()
+            async with self.client.get(url, headers=headers) as res:
+                self.metrics.observe_request(host, res.status, time.time() - start_time)
+                if res.status == 416:
+                    return True
+                if res.status == 200 and range_header is not None:
+                    if single is False:
+                        raise DownloadError('Error: Range requests not supported: {0}'.format(url))
+                    offset = 0
+                elif res.status not in (200, 206):
+                    error_message = 'Error: Unexpected status code when downloading: {0}, {1}'.format(res.status, url)
+                    raise DownloadError(error_message)
+                mode = 'ab' if offset > 0 else 'wb'
+                try:
+                    with open(part_path, mode) as f:
+                        async for chunk in res.content.iter_chunked(self.downloader.buffer_size):
+                            f.write(chunk)
+                            self.metrics.observe_bytes(host, len(chunk))
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                    # The bytes written so far are kept in the part file
+                    print('Info: The connection dropped when downloading: {0}, {1}'.format(url, e))
+                    return False
+
+        return end is None or start + self.downloader.get_part_offset(part_path) > end
+
+    async def __chromium_download_core(self, store_path, download_url, size, md5, chromium_file_paths):
+        """Private Function: __chromium_download_core"""
+
+        loop = asyncio.get_event_loop()
+        try:
+            verified = False
+            if size is not None or md5 is not None:
+                verified = await loop.run_in_executor(None, self.downloader.verify, store_path, size, md5)
+            if verified is True:
+                print('Info: Skip the verified {0}'.format(store_path))
+            else:
+                print('Info: Starting downloading {0}...'.format(store_path))
+                chunks = self.downloader.plan(store_path, size)
+                await asyncio.gather(*[self.__download_chunk(download_url, start, end, part_path, len(chunks) == 1)
+                                       for start, end, part_path in chunks])
+                finished = await loop.run_in_executor(None, self.downloader.finish, store_path, chunks, size, md5)
+                if finished is False:
+                    error_message = 'Error: Size or md5 mismatch when downloading: {0}'.format(download_url)
+                    print(Fore.RED + error_message)
+                    return
+            for chromium_file_path in chromium_file_paths:
+                self.link_chromium_file(store_path, chromium_file_path)
+        except (aiohttp.ClientError, asyncio.TimeoutError, DownloadError) as e:
+            error_message = 'Error: Unexpected error ' \
+                            'when requesting download url: {0}, {1}'.format(download_url, e)
+            print(Fore.RED + error_message)
+
+    async def async_chromium_download(self):
+        """Function: async_chromium_download"""
+
+        print('Info: Start to download chromium...')
+        await asyncio.gather(*[self.__chromium_download_core(store_path,
+                                                             group['download_url'],
+                                                             group['size'],
+                                                             group['md5'],
+                                                             group['chromium_file_paths'])
+                               for store_path, group in self.group_chromium_downloads().items()])
+
+    async def async_run(self, download=False, compact_report=False, ndjson_report=False):
+        """Function: async_run
+
+        Run the whole pipeline with one aiohttp session. The per host concurrency is limited by host_limits.
+        """
+
+        start_time = time.time()
+        connector = aiohttp.TCPConnector(limit=0, ssl=False)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.time_out, sock_read=self.time_out)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as client:
+            self.client = client
+            self.host_semaphores = dict()
+            # The futures of a previous event loop, such as the run of another channel, are reusable only if done
+            for url in [url for url, future in self.coalesced_requests.items() if future.done() is False]:
+                del self.coalesced_requests[url]
+            self.resume_checkpoint()
+            # The existed positions are already listed if shared from the run of another channel
+            stages = list()
+            if self.checkpoint.is_done('versions') is False:
+                stages.append(self.stage('versions', self.async_get_chromium_versions()))
+            if not self.chromium_existed_positions_index:
+                stages.append(self.stage('existed_positions', self.async_get_existed_positions()))
+            await asyncio.gather(*stages)
+            if self.checkpoint.is_done('versions') is False:
+                self.finish_stage('versions')
+            self.prepare_chromium_position_urls()
+            if self.checkpoint.is_done('positions') is False:
+                await self.stage('positions', self.async_get_chromium_positions())
+                self.finish_stage('positions')
+            if self.checkpoint.is_done('download_urls') is False:
+                await self.stage('download_urls', self.async_get_chromium_download_url())
+                self.finish_stage('download_urls')
+            self.report_coalesced_requests()
+            with self.metrics.stage('report'):
+                if self.shard is not None:
+                    self.shard_report()
+                else:
+                    self.report(compact=compact_report, ndjson=ndjson_report)
+            self.finish_checkpoint()
+            if download is True:
+                await self.stage('download', self.async_chromium_download())
+        self.client = None
+        print('Info: Done in {0:.2f}s'.format(time.time() - start_time))
+        self.write_metrics()
+
+    def run(self, download=False, compact_report=False, ndjson_report=False, workers=None):
+        """Function: run
+
+        See Chromium.run
+
+        :param workers: the concurrent requests to every host, overrides the host limits (default None)
+        """
+
+        if workers is not None:
+            self.default_host_limit = int(workers)
+            self.host_limits = dict((host, int(workers)) for host in self.host_limits.keys())
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.async_run(download=download,
+                                                   compact_report=compact_report,
+                                                   ndjson_report=ndjson_report))
+        finally:
+            loop.close()
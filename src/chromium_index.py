@@ -0,0 +1,168 @@
+from chromium_record import ChromiumRecord
+import sqlite3
+import os
+
+
+class ChromiumIndex(object):
+    """Queryable sqlite index over the records of chromium.stable.json"""
+
+    headers = ['os', 'version', 'position_url', 'position', 'download_position', 'download_prefix', 'download_url']
+    index_version = 1
+
+    def __init__(self, index_path='chromium.stable.db'):
+        self.index_path = index_path
+        self.connection = None
+
+    @staticmethod
+    def get_version_key(version):
+        """Function: get_version_key
+
+        :return: the sortable key of the version, such as 77.0.3865.120 -> 00077.00000.03865.00120
+        """
+
+        return '.'.join(part.zfill(5) if part.isdigit() else part for part in version.split('.'))
+
+    def __iter_rows(self, chromium_downloads):
+        """Private Function: __iter_rows"""
+
+        for os_type, values in chromium_downloads.items():
+            for version, value in values.items():
+                yield (os_type, version, self.get_version_key(version), value['position_url'], value['position'],
+                       value['download_position'], value['download_prefix'], value['download_url'])
+
+    def build(self, chromium_downloads):
+        """Function: build
+
+        Build the index from the report records, and replace the existing index atomically
+
+        :param chromium_downloads: dict of os_type -> version -> record, the content of chromium.stable.json
+        """
+
+        temp_index_path = '{0}.tmp'.format(self.index_path)
+        if os.path.exists(temp_index_path):
+            os.remove(temp_index_path)
+        connection = sqlite3.connect(temp_index_path)
+        try:
+            connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+            connection.execute('INSERT INTO meta (key, value) VALUES (?, ?)', ('version', str(self.index_version)))
+            connection.execute('CREATE TABLE records (os TEXT, version TEXT, version_key TEXT, position_url TEXT, '
+                               'position INTEGER, download_position INTEGER, download_prefix TEXT, download_url TEXT, '
+                               'PRIMARY KEY (os, version))')
+            connection.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                   self.__iter_rows(chromium_downloads))
+            connection.execute('CREATE INDEX records_version ON records (version)')
+            connection.execute('CREATE INDEX records_position ON records (os, download_position)')
+            connection.commit()
+        finally:
+            connection.close()
+        self.close()
+        os.replace(temp_index_path, self.index_path)
+
+    def is_valid(self):
+        """Function: is_valid
+
+        :return: True if the index exists and has the current index version
+        """
+
+        if os.path.exists(self.index_path) is False:
+            return False
+        connection = sqlite3.connect(self.index_path)
+        try:
+            row = connection.execute('SELECT value FROM meta WHERE key = ?', ('version',)).fetchone()
+        except sqlite3.DatabaseError:
+            return False
+        finally:
+            connection.close()
+
+        return row is not None and int(row[0]) == self.index_version
+
+    def update(self, chromium_downloads):
+        """Function: update
+
+        Insert or replace the records in the existed index, costs only the size of the records
+
+        :param chromium_downloads: dict of os_type -> version -> record
+        """
+
+        self.close()
+        connection = sqlite3.connect(self.index_path)
+        try:
+            connection.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                   self.__iter_rows(chromium_downloads))
+            connection.commit()
+        finally:
+            connection.close()
+
+    def build_from_json(self, json_report='chromium.stable.json'):
+        """Function: build_from_json"""
+
+        with open(json_report) as f:
+            self.build(ChromiumRecord.loads(f.read()))
+
+    def open(self):
+        """Function: open"""
+
+        if self.connection is None:
+            if os.path.exists(self.index_path) is False:
+                raise Exception('Error: Index not found: {0}, please build it first'.format(self.index_path))
+            self.connection = sqlite3.connect('file:{0}?mode=ro'.format(self.index_path), uri=True,
+                                              check_same_thread=False)
+
+        return self.connection
+
+    def close(self):
+        """Function: close"""
+
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __query(self, sql, parameters):
+        """Private Function: __query"""
+
+        columns = ', '.join(self.headers)
+        rows = self.open().execute(sql.format(columns), parameters).fetchall()
+
+        return [dict(zip(self.headers, row)) for row in rows]
+
+    def lookup(self, version, os_type=None):
+        """Function: lookup
+
+        :param version: the exact version such as 77.0.3865.120, or a version prefix such as 77.* or 77.0.*
+        :param os_type: mac, win, win64, linux, linux64, android, or None for all
+        :return: list of records, sorted by os and version
+        """
+
+        if version.endswith('*'):
+            condition = 'version GLOB ?'
+        else:
+            condition = 'version = ?'
+        parameters = [version]
+        if os_type is not None:
+            condition += ' AND os = ?'
+            parameters.append(os_type)
+        sql = 'SELECT {0} FROM records WHERE ' + condition + ' ORDER BY os, version_key'
+
+        return self.__query(sql, parameters)
+
+    def nearest(self, position, os_type):
+        """Function: nearest
+
+        :param position: the chromium position
+        :param os_type: mac, win, win64, linux, linux64, android
+        :return: the records with the download position nearest to the position, the right one wins on ties
+        """
+
+        position = int(position)
+        left = self.__query('SELECT {0} FROM records WHERE os = ? AND download_position <= ? '
+                            'ORDER BY download_position DESC LIMIT 1', (os_type, position))
+        right = self.__query('SELECT {0} FROM records WHERE os = ? AND download_position >= ? '
+                             'ORDER BY download_position ASC LIMIT 1', (os_type, position))
+        candidates = left + right
+        if not candidates:
+            return list()
+        nearest = min(candidates, key=lambda record: (abs(record['download_position'] - position),
+                                                      -record['download_position']))
+
+        return self.__query('SELECT {0} FROM records WHERE os = ? AND download_position = ? ORDER BY version_key',
+                            (os_type, nearest['download_position']))
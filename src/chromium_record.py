@@ -0,0 +1,188 @@
+import json
+import sys
+
+try:
+    from urllib.parse import urlparse, parse_qs, unquote, quote
+except ImportError:
+    from urlparse import urlparse, parse_qs
+    from urllib import unquote, quote
+
+try:
+    intern = sys.intern
+except AttributeError:
+    pass
+
+
+class ChromiumRecord(object):
+    """One version of the report, such as chromium.stable.json -> mac -> 77.0.3865.120
+
+    The urls are not stored: the record keeps the version, the positions, the os prefix, the archive file name and the
+    generation, plus one tuple of url templates shared by all the records. The urls are built when accessed, such as
+    record['download_url']. A record whose urls do not follow the templates keeps its raw dict instead.
+    """
+
+    __slots__ = ('version', 'position', 'download_position', 'os_prefix', 'file_name', 'generation', 'templates',
+                 'raw')
+    fields = ('position_url', 'position', 'download_position', 'download_prefix', 'download_url')
+    shared_templates = dict()
+
+    def __init__(self, version, position, download_position, os_prefix, file_name, generation, templates):
+        """
+        :param version: such as 77.0.3865.120
+        :param position: the chromium base position, int
+        :param download_position: the existed position of the archive, int
+        :param os_prefix: such as Mac/
+        :param file_name: the archive file name, such as chrome-mac.zip
+        :param generation: the archive generation, int, or None if the download url has no generation
+        :param templates: (position url template, download prefix template, download url template)
+        """
+
+        self.version = intern(str(version))
+        self.position = position
+        self.download_position = download_position
+        self.os_prefix = intern(str(os_prefix))
+        self.file_name = intern(str(file_name))
+        self.generation = generation
+        self.templates = self.shared_templates.setdefault(templates, templates)
+        self.raw = None
+
+    @staticmethod
+    def get_template(url, *replacements):
+        """Function: get_template
+
+        :param replacements: (value, placeholder) pairs, such as ('version=77.0.3865.120', 'version={0}')
+        :return: the url with the only occurrence of each value replaced by its placeholder, or None
+        """
+
+        template = url.replace('{', '{{').replace('}', '}}')
+        for value, placeholder in replacements:
+            if not value or template.count(value) != 1:
+                return None
+            template = template.replace(value, placeholder)
+
+        return intern(template)
+
+    @classmethod
+    def from_dict(cls, values, version=None):
+        """Function: from_dict
+
+        :param values: the record as in chromium.stable.json
+        :param version: the version of the record, parsed from the position url if None
+        :return: the compact record. If it could not reproduce the values exactly, it keeps the values as is.
+        """
+
+        record = cls.__new__(cls)
+        record.raw = dict(values)
+        try:
+            position_url = values['position_url']
+            download_prefix = values['download_prefix']
+            download_url = urlparse(values['download_url'])
+            if version is None:
+                version = parse_qs(urlparse(position_url).query)['version'][0]
+            prefix = parse_qs(urlparse(download_prefix).query)['prefix'][0]
+            os_prefix = prefix[:-len('{0}/'.format(values['download_position']))]
+            quoted_name = download_url.path.split('/o/', 1)[1]
+            file_name = unquote(quoted_name)[len(prefix):]
+            generation = parse_qs(download_url.query).get('generation', [None])[0]
+            download_url_replacements = [('/o/' + quoted_name, '/o/{0}')]
+            if generation is not None:
+                download_url_replacements.append(('generation=' + generation, 'generation={1}'))
+                generation = int(generation)
+            templates = (cls.get_template(position_url, ('version=' + version, 'version={0}')),
+                         cls.get_template(download_prefix, ('prefix=' + prefix, 'prefix={0}')),
+                         cls.get_template(values['download_url'], *download_url_replacements))
+            if None in templates:
+                return record
+            compact = cls(version, values['position'], values['download_position'], os_prefix, file_name, generation,
+                          templates)
+        except (KeyError, IndexError, TypeError, ValueError):
+            return record
+        if list(compact.items()) != list(values.items()):
+            return record
+
+        return compact
+
+    @classmethod
+    def from_item(cls, version, value, download_position, download_prefix, item):
+        """Function: from_item
+
+        :param value: the position of the version, {'position_url': ..., 'position': ...}
+        :param download_position: the existed position of the archive
+        :param download_prefix: the prefix listing url of the existed position
+        :param item: the archive item of the prefix listing, with its mediaLink
+        """
+
+        return cls.from_dict(dict((('position_url', value['position_url']),
+                                   ('position', value['position']),
+                                   ('download_position', int(download_position)),
+                                   ('download_prefix', download_prefix),
+                                   ('download_url', item['mediaLink']))), version=version)
+
+    def get_prefix(self):
+        """Function: get_prefix, such as Mac/681090/"""
+
+        return '{0}{1}/'.format(self.os_prefix, self.download_position)
+
+    def __getitem__(self, key):
+        if self.raw is not None:
+            return self.raw[key]
+        if key == 'position_url':
+            return self.templates[0].format(self.version)
+        if key == 'position':
+            return self.position
+        if key == 'download_position':
+            return self.download_position
+        if key == 'download_prefix':
+            return self.templates[1].format(self.get_prefix())
+        if key == 'download_url':
+            name = quote(self.get_prefix() + self.file_name, safe='')
+            return self.templates[2].format(name, self.generation)
+        raise KeyError(key)
+
+    def keys(self):
+        """Function: keys"""
+
+        if self.raw is not None:
+            return list(self.raw.keys())
+
+        return list(self.fields)
+
+    def items(self):
+        """Function: items"""
+
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        """Function: to_dict"""
+
+        return dict(self.items())
+
+    @staticmethod
+    def object_pairs_hook(pairs):
+        """Function: object_pairs_hook
+
+        Turn every record into a ChromiumRecord while parsing, so the report is never held as dicts
+        """
+
+        if len(pairs) == len(ChromiumRecord.fields) and \
+                tuple(key for key, value in pairs) == ChromiumRecord.fields:
+            return ChromiumRecord.from_dict(dict(pairs))
+
+        return dict(pairs)
+
+    @staticmethod
+    def loads(content):
+        """Function: loads
+
+        :return: the report json as dict of os_type -> version -> ChromiumRecord
+        """
+
+        return json.loads(content, object_pairs_hook=ChromiumRecord.object_pairs_hook)
+
+    @staticmethod
+    def to_json(value):
+        """Function: to_json, the default of json.dumps for the records"""
+
+        if isinstance(value, ChromiumRecord):
+            return value.to_dict()
+        raise TypeError('Object of type {0} is not JSON serializable'.format(type(value).__name__))
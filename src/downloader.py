@@ -0,0 +1,228 @@
+from requests.packages.urllib3.exceptions import ProtocolError, ReadTimeoutError
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import base64
+import shutil
+import os
+
+
+class DownloadError(Exception):
+    pass
+
+
+class Downloader(object):
+    """Resumable, verified, parallel range downloader"""
+
+    def __init__(self, request, time_out=300, chunk_workers=4, min_chunk_size=32 * 1024 * 1024,
+                 buffer_size=1024 * 1024, on_bytes=None, retries=3):
+        """
+        :param request: function(url, **kwargs) -> requests.Response, such as Chromium.request
+        :param time_out: connect/read timeout in seconds (default 300)
+        :param chunk_workers: how many ranges of one file to download in parallel (default 4)
+        :param min_chunk_size: the files smaller than 2 * min_chunk_size are not split (default 32MB)
+        :param buffer_size: the read/write buffer size (default 1MB)
+        :param on_bytes: function(url, count), called with the bytes written by each chunk request (default None)
+        :param retries: how many times a range is resumed after the connection dropped (default 3)
+        """
+
+        self.request = request
+        self.time_out = time_out
+        self.chunk_workers = int(chunk_workers)
+        self.min_chunk_size = int(min_chunk_size)
+        self.buffer_size = int(buffer_size)
+        self.on_bytes = on_bytes
+        self.retries = int(retries)
+
+    def md5_base64(self, path):
+        """Function: md5_base64
+
+        :return: the md5 of the file, base64 encoded as the md5Hash of the GCS object metadata
+        """
+
+        md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(self.buffer_size), b''):
+                md5.update(block)
+
+        return base64.b64encode(md5.digest()).decode('ascii')
+
+    def verify(self, path, size=None, md5=None):
+        """Function: verify
+
+        :param path: the file to verify
+        :param size: the expected size, skip the check if None
+        :param md5: the expected base64 md5, skip the check if None
+        :return: True if the file exists and matches all the provided metadata
+        """
+
+        if not os.path.isfile(path):
+            return False
+        if size is not None and os.path.getsize(path) != int(size):
+            return False
+        if md5 is not None and self.md5_base64(path) != md5:
+            return False
+
+        return True
+
+    def plan(self, path, size=None):
+        """Function: plan
+
+        Split the file into byte ranges, each one downloaded to its own part file, so it could be resumed.
+
+        :return: list of (start, end, part_path), end is inclusive, or None if the size is unknown
+        """
+
+        if size is None or self.chunk_workers <= 1 or int(size) < 2 * self.min_chunk_size:
+            end = None if size is None else int(size) - 1
+            return [(0, end, '{0}.part'.format(path))]
+        size = int(size)
+        count = min(self.chunk_workers, size // self.min_chunk_size)
+        chunk_size = -(-size // count)
+        chunks = list()
+        for i, start in enumerate(range(0, size, chunk_size)):
+            end = min(start + chunk_size, size) - 1
+            chunks.append((start, end, '{0}.part{1}'.format(path, i)))
+
+        return chunks
+
+    @staticmethod
+    def get_range_header(start, end, offset):
+        """Function: get_range_header
+
+        :param offset: the bytes already downloaded to the part file
+        :return: the Range header, or None if the whole file is requested
+        """
+
+        if start + offset == 0 and end is None:
+            return None
+        if end is None:
+            return 'bytes={0}-'.format(start + offset)
+
+        return 'bytes={0}-{1}'.format(start + offset, end)
+
+    @staticmethod
+    def get_part_offset(part_path):
+        """Function: get_part_offset"""
+
+        if os.path.exists(part_path):
+            return os.path.getsize(part_path)
+
+        return 0
+
+    def download_chunk(self, url, start, end, part_path, single):
+        """Function: download_chunk
+
+        Download the byte range [start, end] to the part file. If the connection drops, the part file is kept and the
+        range is requested again from where it stopped, up to self.retries times.
+        """
+
+        for retry in range(self.retries + 1):
+            if retry > 0:
+                print('Info: Resume the interrupted download ({0}/{1}): {2}'.format(retry, self.retries, part_path))
+            if self.download_range(url, start, end, part_path, single) is True:
+                return
+        raise DownloadError('Error: The connection dropped {0} times when downloading: {1}'.format(self.retries + 1,
+                                                                                                    url))
+
+    def download_range(self, url, start, end, part_path, single):
+        """Function: download_range
+
+        Download the byte range [start, end] to the part file once, resuming from its current size
+
+        :return: True if the range is complete, False if the connection dropped or the body ended early
+        """
+
+        offset = self.get_part_offset(part_path)
+        if end is not None and start + offset > end:
+            return True
+        headers = dict()
+        range_header = self.get_range_header(start, end, offset)
+        if range_header is not None:
+            headers['Range'] = range_header
+        with self.request(url, stream=True, headers=headers, timeout=self.time_out) as r:
+            if r.status_code == 416:
+                return True
+            if r.status_code == 200 and range_header is not None:
+                if single is False:
+                    raise DownloadError('Error: Range requests not supported: {0}'.format(url))
+                # The server ignored the range: restart the part from scratch
+                offset = 0
+            elif r.status_code not in (200, 206):
+                error_message = 'Error: Unexpected status code when downloading: {0}, {1}'.format(r.status_code, url)
+                raise DownloadError(error_message)
+            mode = 'ab' if offset > 0 else 'wb'
+            interrupted = False
+            try:
+                with open(part_path, mode) as f:
+                    shutil.copyfileobj(r.raw, f, self.buffer_size)
+            except (ProtocolError, ReadTimeoutError, OSError) as e:
+                # The bytes written so far are kept in the part file
+                print('Info: The connection dropped when downloading: {0}, {1}'.format(url, e))
+                interrupted = True
+            if self.on_bytes is not None:
+                self.on_bytes(url, self.get_part_offset(part_path) - offset)
+
+        return interrupted is False and (end is None or start + self.get_part_offset(part_path) > end)
+
+    def concatenate(self, path, chunks):
+        """Function: concatenate
+
+        Join the part files into path.part, with sendfile if the os supports it
+        """
+
+        if len(chunks) == 1:
+            return chunks[0][2]
+        joined_path = '{0}.part'.format(path)
+        with open(joined_path, 'wb') as out_f:
+            for start, end, part_path in chunks:
+                with open(part_path, 'rb') as in_f:
+                    if hasattr(os, 'sendfile'):
+                        count = os.path.getsize(part_path)
+                        offset = 0
+                        while offset < count:
+                            offset += os.sendfile(out_f.fileno(), in_f.fileno(), offset, count - offset)
+                    else:
+                        shutil.copyfileobj(in_f, out_f, self.buffer_size)
+        for start, end, part_path in chunks:
+            os.remove(part_path)
+
+        return joined_path
+
+    def finish(self, path, chunks, size=None, md5=None):
+        """Function: finish
+
+        Join the parts, verify them, and move them to the path atomically
+
+        :return: True if verified, otherwise the parts are removed and False is returned
+        """
+
+        joined_path = self.concatenate(path, chunks)
+        if self.verify(joined_path, size, md5) is False:
+            os.remove(joined_path)
+            return False
+        os.replace(joined_path, path)
+
+        return True
+
+    def download(self, url, path, size=None, md5=None):
+        """Function: download
+
+        Download the url to the path. Skip if the path is already verified against the size and md5.
+
+        :return: True if downloaded and verified, or skipped
+        """
+
+        if (size is not None or md5 is not None) and self.verify(path, size, md5):
+            print('Info: Skip the verified {0}'.format(path))
+            return True
+        chunks = self.plan(path, size)
+        if len(chunks) == 1:
+            self.download_chunk(url, *chunks[0], single=True)
+        else:
+            pool = ThreadPoolExecutor(max_workers=len(chunks))
+            futures = [pool.submit(self.download_chunk, url, *chunk, single=False) for chunk in chunks]
+            pool.shutdown(wait=True)
+            for future in futures:
+                future.result()
+
+        return self.finish(path, chunks, size, md5)
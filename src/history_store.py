@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+
+
+class HistoryStore(object):
+    """The releases of <os_type>.history.json, keyed by (os_type, version) with a fingerprint per release"""
+
+    def __init__(self, os_type, history_json_file=None):
+        self.os_type = os_type
+        self.history_json_file = history_json_file or '{0}.history.json'.format(os_type)
+        self.releases = None
+
+    @staticmethod
+    def get_key(release):
+        """Function: get_key
+
+        :return: the version of the release, or its fingerprint if the release has no version
+        """
+
+        try:
+            return release['version']
+        except (KeyError, TypeError):
+            return HistoryStore.get_fingerprint(release)
+
+    @staticmethod
+    def get_fingerprint(release):
+        """Function: get_fingerprint"""
+
+        return hashlib.sha1(json.dumps(release, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def load(self):
+        """Function: load
+
+        Load the history file into a dict of key -> (fingerprint, release). The duplicated releases written by the
+        previous versions of this script are dropped, the first one wins.
+        """
+
+        self.releases = dict()
+        if os.path.exists(self.history_json_file) is False:
+            return self.releases
+        with open(self.history_json_file) as f:
+            releases = json.loads(f.read())
+        for release in releases:
+            key = self.get_key(release)
+            if key not in self.releases:
+                self.releases[key] = (self.get_fingerprint(release), release)
+
+        return self.releases
+
+    def diff(self, releases):
+        """Function: diff
+
+        The changed releases are crawled again, and their records replace the existed ones in the report, see
+        Chromium.get_report_delta.
+
+        :param releases: the releases from history.json
+        :return: the new or changed releases, compared by key and fingerprint
+        """
+
+        if self.releases is None:
+            self.load()
+        new_releases = list()
+        for release in releases:
+            existed = self.releases.get(self.get_key(release))
+            if existed is None or existed[0] != self.get_fingerprint(release):
+                new_releases.append(release)
+
+        return new_releases
+
+    def save(self, releases):
+        """Function: save
+
+        Write the releases from history.json, followed by the stored releases they do not contain anymore.
+        Each key is written once.
+        """
+
+        if self.releases is None:
+            self.load()
+        merged = dict()
+        for release in releases:
+            key = self.get_key(release)
+            if key not in merged:
+                merged[key] = (self.get_fingerprint(release), release)
+        for key, value in self.releases.items():
+            if key not in merged:
+                merged[key] = value
+        with open(self.history_json_file, 'w+') as f:
+            json.dump([release for fingerprint, release in merged.values()], f, indent=4)
+        self.releases = merged
@@ -0,0 +1,168 @@
+from contextlib import contextmanager
+from threading import Lock
+import cProfile
+import bisect
+import time
+import json
+
+
+class Metrics(object):
+    """Per host request counters, latency histograms and per stage wall times of one run"""
+
+    latency_buckets = [0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+    def __init__(self):
+        self.hosts = dict()
+        self.stages = dict()
+        self.started = time.time()
+        self.lock = Lock()
+
+    def __get_host(self, host):
+        """Private Function: __get_host, the caller holds self.lock"""
+
+        if host not in self.hosts:
+            self.hosts[host] = {'requests': dict(),
+                                'retries': 0,
+                                'bytes': 0,
+                                'latency_buckets': [0] * (len(self.latency_buckets) + 1),
+                                'latency_sum': 0.0,
+                                'latency_count': 0}
+
+        return self.hosts[host]
+
+    def observe_request(self, host, status_code, latency, retries=0, count=0):
+        """Function: observe_request
+
+        :param host: the host of the url
+        :param status_code: the final status code, or 'error' if no response
+        :param latency: seconds until the response headers, including the retries
+        :param retries: the retries before the final response (default 0)
+        :param count: the bytes of the response body, if already read (default 0)
+        """
+
+        with self.lock:
+            metrics = self.__get_host(host)
+            status_code = str(status_code)
+            metrics['requests'][status_code] = metrics['requests'].get(status_code, 0) + 1
+            metrics['retries'] += retries
+            metrics['bytes'] += count
+            metrics['latency_buckets'][bisect.bisect_left(self.latency_buckets, latency)] += 1
+            metrics['latency_sum'] += latency
+            metrics['latency_count'] += 1
+
+    def observe_bytes(self, host, count):
+        """Function: observe_bytes
+
+        Count the bytes of a streamed response body, such as a download chunk
+        """
+
+        with self.lock:
+            self.__get_host(host)['bytes'] += count
+
+    @contextmanager
+    def stage(self, name):
+        """Function: stage
+
+        Record the wall time of the with block as the stage, such as: with metrics.stage('positions'): ...
+        """
+
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.stages[name] = self.stages.get(name, 0.0) + time.time() - start_time
+
+    @staticmethod
+    @contextmanager
+    def profile(profile_file=None):
+        """Function: profile
+
+        cProfile the with block, and dump the stats to the profile file. See: python -m pstats <profile_file>
+
+        :param profile_file: the pstats file, None to disable the profiler
+        """
+
+        if profile_file is None:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+            print('Info: Profile written to {0}'.format(profile_file))
+
+    def to_dict(self):
+        """Function: to_dict"""
+
+        with self.lock:
+            hosts = dict()
+            for host, metrics in self.hosts.items():
+                buckets = dict()
+                cumulative = 0
+                for le, bucket in zip([str(le) for le in self.latency_buckets] + ['+Inf'], metrics['latency_buckets']):
+                    cumulative += bucket
+                    buckets[le] = cumulative
+                hosts[host] = {'requests': dict(metrics['requests']),
+                               'retries': metrics['retries'],
+                               'bytes': metrics['bytes'],
+                               'latency_seconds': {'buckets': buckets,
+                                                   'sum': metrics['latency_sum'],
+                                                   'count': metrics['latency_count']}}
+
+            return {'duration_seconds': time.time() - self.started,
+                    'stages_seconds': dict(self.stages),
+                    'hosts': hosts}
+
+    def to_prometheus(self):
+        """Function: to_prometheus
+
+        :return: the metrics in the prometheus text exposition format
+        """
+
+        metrics = self.to_dict()
+        lines = ['# HELP chromium_run_duration_seconds Wall time of the run',
+                 '# TYPE chromium_run_duration_seconds gauge',
+                 'chromium_run_duration_seconds {0}'.format(metrics['duration_seconds']),
+                 '# HELP chromium_stage_duration_seconds Wall time of each stage',
+                 '# TYPE chromium_stage_duration_seconds gauge']
+        for stage, seconds in metrics['stages_seconds'].items():
+            lines.append('chromium_stage_duration_seconds{{stage="{0}"}} {1}'.format(stage, seconds))
+        lines.extend(['# HELP chromium_requests_total Requests by host and final status code',
+                      '# TYPE chromium_requests_total counter'])
+        for host, values in metrics['hosts'].items():
+            for status_code, count in values['requests'].items():
+                lines.append('chromium_requests_total{{host="{0}",status="{1}"}} {2}'.format(host, status_code, count))
+        for name, key, help_text in [('chromium_retries_total', 'retries', 'Retries by host'),
+                                     ('chromium_bytes_total', 'bytes', 'Response body bytes by host')]:
+            lines.extend(['# HELP {0} {1}'.format(name, help_text), '# TYPE {0} counter'.format(name)])
+            for host, values in metrics['hosts'].items():
+                lines.append('{0}{{host="{1}"}} {2}'.format(name, host, values[key]))
+        lines.extend(['# HELP chromium_request_duration_seconds Request latency by host',
+                      '# TYPE chromium_request_duration_seconds histogram'])
+        for host, values in metrics['hosts'].items():
+            latency = values['latency_seconds']
+            for le, count in latency['buckets'].items():
+                lines.append('chromium_request_duration_seconds_bucket{{host="{0}",le="{1}"}} {2}'.format(host, le,
+                                                                                                          count))
+            lines.append('chromium_request_duration_seconds_sum{{host="{0}"}} {1}'.format(host, latency['sum']))
+            lines.append('chromium_request_duration_seconds_count{{host="{0}"}} {1}'.format(host, latency['count']))
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, metrics_file):
+        """Function: write
+
+        :param metrics_file: *.prom or *.txt for the prometheus text format, otherwise json
+        """
+
+        if metrics_file.endswith('.prom') or metrics_file.endswith('.txt'):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), indent=4)
+        with open(metrics_file, 'w+') as f:
+            f.write(content)
+        print('Info: Metrics written to {0}'.format(metrics_file))
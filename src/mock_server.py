@@ -0,0 +1,366 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+from socketserver import ThreadingMixIn
+from threading import Thread, Lock
+import argparse
+import hashlib
+import random
+import base64
+import time
+import json
+import re
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """A local stand-in of the omahaproxy history/deps api and the chromium-browser-snapshots bucket listing api"""
+
+    protocol_version = 'HTTP/1.1'
+    list_pattern = re.compile(r'^/storage/v1/b/([^/]+)/o$')
+    media_pattern = re.compile(r'^/download/storage/v1/b/([^/]+)/o/(.+)$')
+    range_pattern = re.compile(r'^bytes=(\d+)-(\d*)$')
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, content, status_code=200):
+        """Function: send_json"""
+
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_media(self, name):
+        """Function: send_media
+
+        Send the object content, supports the Range header
+        """
+
+        if name not in self.server.mock.objects:
+            self.send_json({'error': 'Not Found: {0}'.format(name)}, status_code=404)
+            return
+        body = self.server.mock.get_content(name)
+        status_code = 200
+        range_match = self.range_pattern.match(self.headers.get('Range', ''))
+        if range_match:
+            start = int(range_match.group(1))
+            end = int(range_match.group(2)) if range_match.group(2) else len(body) - 1
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            end = min(end, len(body) - 1)
+            status_code = 206
+            content_range = 'bytes {0}-{1}/{2}'.format(start, end, len(body))
+            body = body[start:end + 1]
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Length', str(len(body)))
+        if status_code == 206:
+            self.send_header('Content-Range', content_range)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        mock = self.server.mock
+        if mock.latency > 0:
+            time.sleep(mock.latency)
+        if mock.inject_error() is True:
+            self.send_json({'error': 'Injected error'}, status_code=mock.error_status)
+            return
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        media_match = self.media_pattern.match(url.path)
+        if url.path == '/history.json':
+            self.send_json(mock.get_history(query.get('os'), query.get('channel', 'stable')))
+        elif url.path == '/deps.json':
+            self.send_json({'chromium_base_position': mock.positions.get(query.get('version'))})
+        elif self.list_pattern.match(url.path):
+            self.send_json(self.server.mock.list_objects(query))
+        elif media_match:
+            self.send_media(unquote(media_match.group(2)))
+        else:
+            self.send_json({'error': 'Not Found: {0}'.format(url.path)}, status_code=404)
+
+
+class MockServer(object):
+    """Serve a fake omahaproxy and chromium-browser-snapshots bucket on localhost"""
+
+    def __init__(self, objects=None, page_size=1000, host='127.0.0.1', port=0, releases=None, positions=None,
+                 latency=0.0, error_rate=0.0, error_status=503, seed=None):
+        """
+        :param objects: see set_objects
+        :param page_size: the max results per listing page (default 1000)
+        :param releases: dict of os -> list of releases, served as history.json?os=<os>&channel=<channel>
+        :param positions: dict of version -> chromium base position, served as deps.json?version=<version>
+        :param latency: seconds to sleep before each response (default 0)
+        :param error_rate: the probability of answering a request with error_status instead (default 0)
+        :param error_status: the status code of the injected errors (default 503)
+        :param seed: the random seed of the injected errors, for repeatable runs (default None)
+        """
+
+        self.objects = dict()
+        self.object_names = list()
+        self.page_size = int(page_size)
+        self.releases = releases or dict()
+        self.positions = positions or dict()
+        self.latency = float(latency)
+        self.error_rate = float(error_rate)
+        self.error_status = int(error_status)
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.lock = Lock()
+        self.server = ThreadingHTTPServer((host, port), MockHandler)
+        self.server.mock = self
+        self.thread = None
+        self.set_objects(objects or dict())
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+
+        return 'http://{0}:{1}'.format(host, port)
+
+    def set_objects(self, objects):
+        """Function: set_objects
+
+        :param objects: dict of object name -> object metadata, such as {'Mac/722274/chrome-mac.zip': {'size': '10'}}
+        """
+
+        self.objects = objects
+        self.object_names = sorted(objects.keys())
+
+    def inject_error(self):
+        """Function: inject_error
+
+        Count the request, and decide if it is answered with an injected error
+
+        :return: True if the request fails
+        """
+
+        with self.lock:
+            self.requests += 1
+            if self.error_rate > 0 and self.random.random() < self.error_rate:
+                self.errors += 1
+                return True
+
+        return False
+
+    def get_history(self, os_type, channel='stable'):
+        """Function: get_history
+
+        :return: the releases of the os and channel as history.json, the crawler requests linux for both linux and
+                 linux64
+        """
+
+        return [release for release in self.releases.get(os_type, list())
+                if release.get('channel', 'stable') == channel]
+
+    @staticmethod
+    def encode_page_token(name):
+        """Function: encode_page_token"""
+
+        return base64.urlsafe_b64encode(name.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_page_token(token):
+        """Function: decode_page_token"""
+
+        return base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8')
+
+    def get_content(self, name):
+        """Function: get_content
+
+        :return: the fake content of the object, repeating its name up to its size
+        """
+
+        size = int(self.objects[name].get('size', 0))
+        seed = name.encode('utf-8')
+
+        return (seed * (size // len(seed) + 1))[:size]
+
+    def get_item(self, name):
+        """Function: get_item"""
+
+        item = {'kind': 'storage#object', 'name': name}
+        item.update(self.objects[name])
+        item.setdefault('size', '0')
+        item.setdefault('generation', '1')
+        if 'md5Hash' not in item:
+            item['md5Hash'] = base64.b64encode(hashlib.md5(self.get_content(name)).digest()).decode('ascii')
+        item.setdefault('mediaLink', '{0}/download/storage/v1/b/chromium-browser-snapshots/o/{1}?'
+                                     'generation={2}&alt=media'.format(self.url, name.replace('/', '%2F'),
+                                                                       item['generation']))
+
+        return item
+
+    def list_objects(self, query):
+        """Function: list_objects
+
+        Mimic the objects.list api: prefix, delimiter, startOffset, endOffset, pageToken, maxResults
+        """
+
+        prefix = unquote(query.get('prefix', ''))
+        delimiter = query.get('delimiter')
+        start_offset = query.get('startOffset')
+        end_offset = query.get('endOffset')
+        max_results = int(query.get('maxResults', self.page_size))
+        page_start = None
+        if 'pageToken' in query:
+            page_start = self.decode_page_token(query['pageToken'])
+
+        entries = list()
+        seen_prefixes = set()
+        for name in self.object_names:
+            if not name.startswith(prefix):
+                continue
+            if start_offset is not None and name < start_offset:
+                continue
+            if end_offset is not None and name >= end_offset:
+                continue
+            rest = name[len(prefix):]
+            if delimiter and delimiter in rest:
+                sub_prefix = prefix + rest[:rest.index(delimiter) + len(delimiter)]
+                if sub_prefix not in seen_prefixes:
+                    seen_prefixes.add(sub_prefix)
+                    entries.append((sub_prefix, True))
+            else:
+                entries.append((name, False))
+        if page_start is not None:
+            entries = [entry for entry in entries if entry[0] > page_start]
+
+        page = entries[:max_results]
+        content = {'kind': 'storage#objects'}
+        prefixes = [name for name, is_prefix in page if is_prefix]
+        items = [self.get_item(name) for name, is_prefix in page if not is_prefix]
+        if prefixes:
+            content['prefixes'] = prefixes
+        if items:
+            content['items'] = items
+        if len(entries) > max_results:
+            content['nextPageToken'] = self.encode_page_token(page[-1][0])
+
+        return content
+
+    def start(self):
+        """Function: start"""
+
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+        """Function: stop"""
+
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def get_objects_from_records(chromium_downloads):
+    """Function: get_objects_from_records
+
+    Build the fake bucket objects from the download urls of the records of chromium.stable.json
+    """
+
+    objects = dict()
+    for os_type, values in chromium_downloads.items():
+        for version, value in values.items():
+            download_url = urlparse(value['download_url'])
+            name = unquote(download_url.path.split('/o/', 1)[1])
+            generation = parse_qs(download_url.query).get('generation', ['1'])[0]
+            objects[name] = {'generation': generation, 'size': str(len(name) * 1024)}
+
+    return objects
+
+
+def get_releases_from_records(chromium_downloads, channel='stable'):
+    """Function: get_releases_from_records
+
+    Build the fake history.json releases from the records. history.json has no linux64, its versions are in linux.
+    """
+
+    releases = dict()
+    for os_type, values in chromium_downloads.items():
+        history_os_type = 'linux' if os_type == 'linux64' else os_type
+        seen_versions = set(release['version'] for release in releases.get(history_os_type, list()))
+        for version in values.keys():
+            if version not in seen_versions:
+                seen_versions.add(version)
+                releases.setdefault(history_os_type, list()).append({'os': history_os_type,
+                                                                     'channel': channel,
+                                                                     'version': version,
+                                                                     'timestamp': '2019-12-10 20:28:00.000000'})
+
+    return releases
+
+
+def get_positions_from_records(chromium_downloads):
+    """Function: get_positions_from_records
+
+    Build the fake deps.json positions from the records, the first record of a version wins
+    """
+
+    positions = dict()
+    for os_type, values in chromium_downloads.items():
+        for version, value in values.items():
+            positions.setdefault(version, str(value['position']))
+
+    return positions
+
+
+def load_objects_from_report(json_report):
+    """Function: load_objects_from_report
+
+    Build the fake bucket objects from the download urls of chromium.stable.json
+    """
+
+    with open(json_report) as f:
+        return get_objects_from_records(json.loads(f.read()))
+
+
+def load_mock_server_from_report(json_report, **kwargs):
+    """Function: load_mock_server_from_report
+
+    :return: a MockServer serving the history, deps and bucket objects of chromium.stable.json, see MockServer
+    """
+
+    with open(json_report) as f:
+        chromium_downloads = json.loads(f.read())
+
+    return MockServer(get_objects_from_records(chromium_downloads),
+                      releases=get_releases_from_records(chromium_downloads),
+                      positions=get_positions_from_records(chromium_downloads),
+                      **kwargs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a fake chromium snapshots bucket...')
+    parser.add_argument('-r', '--report', default='chromium.stable.json',
+                        help='The json report to generate the bucket objects from. Default: chromium.stable.json')
+    parser.add_argument('-p', '--port', type=int, default=8000,
+                        help='The port to listen on. Default: 8000')
+    parser.add_argument('--page-size', type=int, default=1000,
+                        help='The max results per listing page. Default: 1000')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds to sleep before each response. Default: 0')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='The probability of answering a request with --error-status. Default: 0')
+    parser.add_argument('--error-status', type=int, default=503,
+                        help='The status code of the injected errors. Default: 503')
+    args = parser.parse_args()
+    mock_server = load_mock_server_from_report(args.report, page_size=args.page_size, port=args.port,
+                                               latency=args.latency, error_rate=args.error_rate,
+                                               error_status=args.error_status)
+    print('Info: Serving the fake omahaproxy and bucket at {0}, use it as --omahaproxy-host and '
+          '--googleapis-host...'.format(mock_server.url))
+    mock_server.server.serve_forever()
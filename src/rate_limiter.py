@@ -0,0 +1,162 @@
+from email.utils import parsedate_tz, mktime_tz
+from threading import Lock
+import time
+
+
+class TokenBucket(object):
+    """Token bucket of one host"""
+
+    def __init__(self, rate, burst, min_rate, max_rate):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.blocked_until = 0.0
+        self.lock = Lock()
+
+    def reserve(self):
+        """Function: reserve
+
+        Take one token. The token could be borrowed from the future, the caller has to wait until it is refilled.
+
+        :return: the seconds to wait before sending the request
+        """
+
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = 0.0
+            if self.tokens < 0:
+                wait = -self.tokens / self.rate
+
+            return max(wait, self.blocked_until - now)
+
+    def slow_down(self, retry_after=None):
+        """Function: slow_down
+
+        Multiplicative decrease, and block the host for Retry-After seconds if provided
+        """
+
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, time.time() + retry_after)
+
+    def speed_up(self):
+        """Function: speed_up
+
+        Additive increase, so the rate climbs back slowly after a slow down, up to max_rate
+        """
+
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.min_rate)
+
+
+class RateLimiter(object):
+    """Shared per host rate limiter for all the requests, adapts to 429/503 and Retry-After"""
+
+    def __init__(self, host_rates=None, default_rate=10.0, burst=5, min_rate=0.1, max_rate_factor=1):
+        """
+        :param host_rates: dict of host -> requests per second, such as {'omahaproxy.appspot.com': 2}
+        :param default_rate: requests per second of the hosts not in host_rates (default 10)
+        :param burst: the bucket size (default 5)
+        :param min_rate: the rate never goes below it when slowing down (default 0.1)
+        :param max_rate_factor: the rate never goes above initial rate * max_rate_factor when speeding up (default 1,
+                                the configured rate is the ceiling, and only recovers back to it after a slow down)
+        """
+
+        self.host_rates = dict((host, self.validate_rate(rate, host)) for host, rate in (host_rates or dict()).items())
+        self.default_rate = self.validate_rate(default_rate, 'default')
+        self.burst = burst
+        self.min_rate = self.validate_rate(min_rate, 'min')
+        self.max_rate_factor = max_rate_factor
+        self.slow_down_status_codes = [429, 503]
+        self.buckets = dict()
+        self.lock = Lock()
+
+    @staticmethod
+    def validate_rate(rate, name):
+        """Function: validate_rate
+
+        A rate of 0 would never refill the bucket, the requests per second must be positive
+
+        :param rate: requests per second
+        :param name: the host or the name of the rate, for the error message
+        :return: the rate as float
+        """
+
+        try:
+            value = float(rate)
+        except (TypeError, ValueError):
+            value = None
+        if value is None or not value > 0:
+            raise Exception('Error: The {0} rate must be greater than 0 requests per second, got: {1}'.format(name,
+                                                                                                             rate))
+
+        return value
+
+    def get_bucket(self, host):
+        """Function: get_bucket"""
+
+        with self.lock:
+            if host not in self.buckets:
+                rate = self.host_rates.get(host, self.default_rate)
+                self.buckets[host] = TokenBucket(rate=rate,
+                                                 burst=self.burst,
+                                                 min_rate=min(self.min_rate, rate),
+                                                 max_rate=rate * self.max_rate_factor)
+
+            return self.buckets[host]
+
+    def reserve(self, host):
+        """Function: reserve
+
+        :return: the seconds to wait before sending the request to the host
+        """
+
+        return self.get_bucket(host).reserve()
+
+    def acquire(self, host):
+        """Function: acquire
+
+        Block the current thread until a request could be sent to the host
+        """
+
+        wait = self.reserve(host)
+        if wait > 0:
+            time.sleep(wait)
+
+    @staticmethod
+    def parse_retry_after(retry_after):
+        """Function: parse_retry_after
+
+        :param retry_after: the Retry-After header, seconds or http date
+        :return: the seconds to wait, or None if not parsable
+        """
+
+        if retry_after is None:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            date = parsedate_tz(retry_after)
+            if date is None:
+                return None
+            return max(0.0, mktime_tz(date) - time.time())
+
+    def feedback(self, host, status_code, retry_after=None):
+        """Function: feedback
+
+        Adapt the host rate from the response status code
+        """
+
+        bucket = self.get_bucket(host)
+        if status_code in self.slow_down_status_codes:
+            bucket.slow_down(self.parse_retry_after(retry_after))
+        elif status_code is not None and status_code < 400:
+            bucket.speed_up()
@@ -0,0 +1,25 @@
+import sys
+import os
+
+# The modules of src/ import each other as top level modules, such as: from chromium import Chromium
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from mock_server import load_mock_server_from_report  # noqa: E402
+from helpers import json_report, crawl  # noqa: E402
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def mock_server():
+    """The history, deps and bucket objects of the committed chromium.stable.json, listed 50 prefixes per page"""
+
+    server = load_mock_server_from_report(json_report, page_size=50).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope='session')
+def plain_report(mock_server, tmp_path_factory):
+    """The json report of a plain forced run, to compare the other runs with"""
+
+    return crawl(mock_server, tmp_path_factory.mktemp('plain'), checkpoint_file=None)[1]
@@ -0,0 +1,70 @@
+from chromium import Chromium
+import json
+import os
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+json_report = os.path.join(root_dir, 'chromium.stable.json')
+csv_report = os.path.join(root_dir, 'chromium.stable.csv')
+
+
+def get_kwargs(server, work_dir, **kwargs):
+    """Function: get_kwargs
+
+    :return: the crawler arguments to crawl the mock server, with the positions cache in the work dir
+    """
+
+    values = dict(fore_crawl=True,
+                  omahaproxy_host=server.url,
+                  googleapis_host=server.url,
+                  omahaproxy_rate=10000,
+                  googleapis_rate=10000,
+                  positions_cache=os.path.join(str(work_dir), 'chromium.positions.db'))
+    values.update(kwargs)
+
+    return values
+
+
+def read_json(file_path):
+    """Function: read_json"""
+
+    with open(file_path) as f:
+        return json.loads(f.read())
+
+
+def count_records(report):
+    """Function: count_records"""
+
+    return sum(len(values) for values in report.values())
+
+
+def crawl(server, work_dir, crawler=Chromium, **kwargs):
+    """Function: crawl
+
+    Run the crawler in the work dir
+
+    :return: (the crawler, the json report)
+    """
+
+    cur_dir = os.getcwd()
+    os.chdir(str(work_dir))
+    try:
+        chromium = crawler(**get_kwargs(server, work_dir, **kwargs))
+        chromium.run()
+    finally:
+        os.chdir(cur_dir)
+
+    return chromium, read_json(os.path.join(str(work_dir), 'chromium.{0}.json'.format(chromium.channel)))
+
+
+def get_objects(positions, file_name='chrome.zip', size='10'):
+    """Function: get_objects
+
+    :return: one archive per os type and position, such as Mac/681090/chrome.zip
+    """
+
+    objects = dict()
+    for os_type, prefix in Chromium(checkpoint_file=None).os_type.items():
+        for position in positions:
+            objects['{0}{1}/{2}'.format(prefix, position, file_name)] = {'size': size, 'md5Hash': 'AAAA'}
+
+    return objects
@@ -0,0 +1,66 @@
+from helpers import crawl
+from chromium import Chromium
+import pytest
+import re
+
+position_listing_pattern = re.compile(r'prefix=[^/&]+/\d+/&')
+
+
+def get_items(*files):
+    """Function: get_items
+
+    :param files: (file name, size) pairs
+    :return: the prefix listing items of Win/681100/
+    """
+
+    return [{'name': 'Win/681100/{0}'.format(file_name), 'size': str(size)} for file_name, size in files]
+
+
+def get_file_name(item):
+    """Function: get_file_name"""
+
+    return None if item is None else item['name'].rsplit('/', 1)[-1]
+
+
+@pytest.mark.parametrize('files, file_name', [
+    # The first file name of the rule wins, not the largest file
+    ([('chrome-win32.zip', 300), ('chrome-win.zip', 200), ('chrome-win_browser_tests.zip', 900)], 'chrome-win.zip'),
+    ([('chrome-win32.zip', 300), ('mini_installer.exe', 400)], 'chrome-win32.zip'),
+    # Without a rule match, the largest file not filtered
+    ([('chrome-win_browser_tests.zip', 900), ('chrome-win-syms.zip', 800), ('chromium.zip', 200), ('a.zip', 100)],
+     'chromium.zip'),
+    ([('chrome-win_browser_tests.zip', 900), ('mini_installer.exe', 400)], None),
+    ([], None),
+])
+def test_select_artifact(files, file_name):
+    chromium = Chromium(checkpoint_file=None)
+
+    assert get_file_name(chromium.select_artifact('win', get_items(*files))) == file_name
+
+
+def test_artifact_rules_override_the_defaults():
+    chromium = Chromium(checkpoint_file=None, artifact_rules={'win': ['chromium.zip']})
+    items = get_items(('chrome-win.zip', 300), ('chromium.zip', 200))
+
+    assert get_file_name(chromium.select_artifact('win', items)) == 'chromium.zip'
+    assert chromium.artifact_rules['mac'] == ['chrome-mac.zip']
+
+
+def test_direct_urls_skip_the_prefix_listing():
+    chromium = Chromium(checkpoint_file=None, direct_urls=True)
+
+    items = chromium.get_prefix_items('mac', 681090, 'Mac/681090/')
+    assert [item['name'] for item in items] == ['Mac/681090/chrome-mac.zip']
+    assert items[0]['mediaLink'].endswith('/o/Mac%2F681090%2Fchrome-mac.zip?alt=media')
+    # Two rules for win, its prefix has to be listed
+    assert chromium.get_prefix_items('win', 681100, 'Win/681100/') is None
+
+
+def test_cached_prefix_items_are_not_listed_again(mock_server, plain_report, tmp_path):
+    chromium, report = crawl(mock_server, tmp_path, checkpoint_file=None)
+    assert [url for url in chromium.coalesced_requests.keys() if position_listing_pattern.search(url)]
+
+    chromium, report = crawl(mock_server, tmp_path, checkpoint_file=None)
+
+    assert report == plain_report
+    assert [url for url in chromium.coalesced_requests.keys() if position_listing_pattern.search(url)] == list()
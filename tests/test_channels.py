@@ -0,0 +1,48 @@
+from helpers import json_report, get_kwargs, read_json, crawl
+from mock_server import load_mock_server_from_report
+from chromium import Chromium, run_channels
+import pytest
+import os
+
+
+@pytest.fixture(scope='module')
+def channels_server():
+    """The mock server of the committed report, the 7x versions are released to beta too"""
+
+    server = load_mock_server_from_report(json_report, page_size=50)
+    for os_type, releases in list(server.releases.items()):
+        releases.extend(dict(release, channel='beta') for release in list(releases)
+                        if release['version'].startswith('7'))
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_channels_share_the_listing_and_the_lookups(channels_server, tmp_path):
+    separate_reports = dict()
+    separate_requests = dict()
+    for channel in ['stable', 'beta']:
+        work_dir = tmp_path / channel
+        work_dir.mkdir()
+        requests = channels_server.requests
+        separate_reports[channel] = crawl(channels_server, work_dir, channel=channel, checkpoint_file=None)[1]
+        separate_requests[channel] = channels_server.requests - requests
+
+    work_dir = tmp_path / 'shared'
+    work_dir.mkdir()
+    requests = channels_server.requests
+    cur_dir = os.getcwd()
+    os.chdir(str(work_dir))
+    try:
+        run_channels(Chromium, ['stable', 'beta'], **get_kwargs(channels_server, work_dir, checkpoint_file=None))
+    finally:
+        os.chdir(cur_dir)
+    shared_requests = channels_server.requests - requests
+
+    assert separate_reports['beta']
+    for channel in ['stable', 'beta']:
+        assert read_json(str(work_dir / 'chromium.{0}.json'.format(channel))) == separate_reports[channel]
+    # Beta only requests its history.json, one per os type, linux64 shares the one of linux. The listings and the
+    # deps.json/prefix lookups are shared with stable.
+    assert shared_requests <= separate_requests['stable'] + len(Chromium(checkpoint_file=None).os_type) - 1
+    assert shared_requests < separate_requests['stable'] + separate_requests['beta']
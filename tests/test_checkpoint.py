@@ -0,0 +1,86 @@
+from helpers import get_kwargs, read_json, crawl
+from chromium import Chromium
+import requests
+import pytest
+import os
+
+failed_urls = ['deps.json?version=77.0.3865.120', 'prefix=Mac/681090/']
+
+
+def test_resumed_run_matches_plain_run(mock_server, plain_report, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    chromium = Chromium(**get_kwargs(mock_server, tmp_path))
+    set_download_item = chromium.set_download_item
+    calls = [0]
+
+    def crash(*args):
+        calls[0] += 1
+        if calls[0] > 300:
+            raise RuntimeError('crash')
+        set_download_item(*args)
+
+    chromium.set_download_item = crash
+    with pytest.raises(Exception):
+        chromium.run()
+    assert os.path.exists('chromium.checkpoint.ndjson')
+    assert os.path.exists('chromium.stable.json') is False
+
+    chromium = Chromium(**get_kwargs(mock_server, tmp_path))
+    chromium.run()
+
+    assert read_json('chromium.stable.json') == plain_report
+    assert os.path.exists('chromium.checkpoint.ndjson') is False
+
+
+def fail_requests(chromium, error):
+    """Function: fail_requests
+
+    Raise the error for the requests of failed_urls, through the coroutine fetch of the async engine
+    """
+
+    fetch = chromium.fetch
+
+    def fail(url):
+        if any(failed_url in url for failed_url in failed_urls):
+            raise error('Connection refused: {0}'.format(url))
+        return fetch(url)
+
+    async def async_fail(url):
+        if any(failed_url in url for failed_url in failed_urls):
+            raise error('Connection refused: {0}'.format(url))
+        return await fetch(url)
+
+    chromium.fetch = async_fail if chromium.__class__ is not Chromium else fail
+
+
+@pytest.mark.parametrize('engine', ['thread', 'async'])
+def test_failed_items_are_retried_by_the_next_run(mock_server, plain_report, tmp_path, monkeypatch, engine):
+    if engine == 'async':
+        crawler = pytest.importorskip('chromium_async').AsyncChromium
+        error = pytest.importorskip('aiohttp').ClientError
+    else:
+        crawler, error = Chromium, requests.ConnectionError
+    monkeypatch.chdir(tmp_path)
+    requests_count = mock_server.requests
+    chromium = crawler(**get_kwargs(mock_server, tmp_path))
+    fail_requests(chromium, error)
+    chromium.run()
+    first_run_requests = mock_server.requests - requests_count
+
+    report = read_json('chromium.stable.json')
+    assert '77.0.3865.120' not in report['win']
+    assert not [version for version, value in report['mac'].items() if value['download_position'] == 681090]
+    assert chromium.checkpoint.get_failures('positions') > 0
+    assert chromium.checkpoint.get_failures('download_urls') > 0
+    assert chromium.checkpoint.is_done('versions') is True
+    assert chromium.checkpoint.is_done('positions') is False
+    assert chromium.checkpoint.is_done('download_urls') is False
+    assert os.path.exists('chromium.checkpoint.ndjson')
+
+    requests_count = mock_server.requests
+    chromium, report = crawl(mock_server, tmp_path, crawler=crawler)
+
+    assert report == plain_report
+    assert os.path.exists('chromium.checkpoint.ndjson') is False
+    # Only the history, the existed positions and the failed items are requested again
+    assert mock_server.requests - requests_count < first_run_requests / 4
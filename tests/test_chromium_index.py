@@ -0,0 +1,87 @@
+from helpers import root_dir, json_report, read_json, count_records
+from chromium_index import ChromiumIndex
+from chromium import Chromium
+import subprocess
+import pytest
+import shutil
+import sys
+import os
+
+
+@pytest.fixture(scope='module')
+def chromium_index(tmp_path_factory):
+    chromium_index = ChromiumIndex(str(tmp_path_factory.mktemp('index') / 'chromium.stable.db'))
+    chromium_index.build_from_json(json_report)
+    yield chromium_index
+    chromium_index.close()
+
+
+def test_lookup_exact_version(chromium_index):
+    records = chromium_index.lookup('77.0.3865.120', 'mac')
+
+    assert len(records) == 1
+    assert records[0]['download_position'] == 681090
+    assert records[0] == dict(os='mac', version='77.0.3865.120', **read_json(json_report)['mac']['77.0.3865.120'])
+
+
+def test_lookup_version_prefix(chromium_index):
+    records = chromium_index.lookup('77.*', 'mac')
+
+    # Sorted by the version numbers, not as text
+    assert [record['version'] for record in records] == ['77.0.3865.75', '77.0.3865.90', '77.0.3865.120']
+    assert len(chromium_index.lookup('77.*')) == sum(1 for values in read_json(json_report).values()
+                                                     for version in values.keys() if version.startswith('77.'))
+
+
+def test_nearest_download_position(chromium_index):
+    records = chromium_index.nearest(681094, 'mac')
+
+    assert records
+    assert set(record['download_position'] for record in records) == {681090}
+    assert '77.0.3865.120' in [record['version'] for record in records]
+    assert chromium_index.nearest(681094, 'unknown') == list()
+
+
+def run_lookup(cwd, *args):
+    """Function: run_lookup
+
+    :return: the completed python src/chromium.py lookup process
+    """
+
+    return subprocess.run([sys.executable, os.path.join(root_dir, 'src', 'chromium.py'), 'lookup'] + list(args),
+                          cwd=str(cwd), stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+
+def test_lookup_command(tmp_path):
+    process = run_lookup(tmp_path, '77.*', '--os', 'mac', '--rebuild', json_report)
+    assert process.returncode == 0
+    assert len(process.stdout.splitlines()) == 3
+
+    process = run_lookup(tmp_path, '--os', 'mac', '--nearest', '681094')
+    assert process.returncode == 0
+    assert '77.0.3865.120' in process.stdout
+
+
+def test_lookup_command_without_index(tmp_path):
+    process = run_lookup(tmp_path, '77.*')
+
+    assert process.returncode == 1
+    assert 'Error: Index not found' in process.stdout
+    assert 'Traceback' not in process.stderr
+
+
+def test_report_rebuilds_stale_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    shutil.copyfile(json_report, 'chromium.stable.json')
+    ChromiumIndex('chromium.stable.db').build({'mac': read_json(json_report)['mac']})
+    # The index of a previous run, older than the json report
+    json_report_mtime = os.path.getmtime('chromium.stable.json')
+    os.utime('chromium.stable.db', (json_report_mtime - 10, json_report_mtime - 10))
+
+    Chromium(checkpoint_file=None).report()
+
+    chromium_index = ChromiumIndex('chromium.stable.db')
+    try:
+        assert len(chromium_index.lookup('*')) == count_records(read_json(json_report))
+    finally:
+        chromium_index.close()
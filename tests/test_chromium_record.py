@@ -0,0 +1,40 @@
+from helpers import json_report, csv_report, read_json
+from chromium_record import ChromiumRecord
+from chromium import Chromium
+import json
+
+
+def test_report_round_trips_committed_json(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    chromium = Chromium(fore_crawl=True, checkpoint_file=None)
+    with open(json_report) as f:
+        chromium.chromium_downloads = ChromiumRecord.loads(f.read())
+    chromium.report()
+
+    for committed, written in [(json_report, 'chromium.stable.json'), (csv_report, 'chromium.stable.csv')]:
+        with open(committed, 'rb') as committed_f, open(written, 'rb') as written_f:
+            assert written_f.read() == committed_f.read()
+
+
+def test_loads_builds_compact_records():
+    with open(json_report) as f:
+        records = ChromiumRecord.loads(f.read())
+    expected = read_json(json_report)
+
+    assert json.loads(json.dumps(records, default=ChromiumRecord.to_json)) == expected
+    compact_records = [record for values in records.values() for record in values.values() if record.raw is None]
+    assert len(compact_records) == sum(len(values) for values in expected.values())
+    # One tuple of url templates per host layout, shared by the records
+    assert len(set(id(record.templates) for record in compact_records)) < 10
+
+
+def test_irregular_record_keeps_its_values():
+    values = {'position_url': 'https://omahaproxy.appspot.com/deps.json?version=77.0.3865.120',
+              'position': 681094,
+              'download_position': 681090,
+              'download_prefix': 'https://example.com/listing',
+              'download_url': 'https://example.com/chrome-mac.zip'}
+    record = ChromiumRecord.from_dict(values)
+
+    assert record.raw == values
+    assert record.to_dict() == values
@@ -0,0 +1,33 @@
+from helpers import get_kwargs
+from mock_server import MockServer
+from chromium import Chromium
+import glob
+import os
+
+name = 'Mac/681090/chrome-mac.zip'
+
+
+def test_shared_archive_is_downloaded_once_and_linked(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = MockServer({name: {'size': '1000'}}).start()
+    try:
+        item = server.get_item(name)
+        chromium = Chromium(**get_kwargs(server, tmp_path, checkpoint_file=None))
+        # The two versions have the same nearest position, so the same archive
+        for version in ['77.0.3865.90', '77.0.3865.120']:
+            chromium.chromium_downloads.setdefault('mac', {})[version] = {'download_url': item['mediaLink']}
+            chromium.chromium_download_items.setdefault('mac', {})[version] = item
+        chromium.chromium_download()
+        requests = server.requests
+        # The verified archive is skipped on the next run
+        chromium.chromium_download()
+    finally:
+        server.stop()
+
+    assert requests == 1
+    assert server.requests == 1
+    store_paths = glob.glob(os.path.join('Downloads', '.store', '**', 'chrome-mac.zip'), recursive=True)
+    assert store_paths == [os.path.join('Downloads', '.store', 'Mac', '681090', '1', 'chrome-mac.zip')]
+    for version in ['77.0.3865.90', '77.0.3865.120']:
+        assert os.path.samefile(os.path.join('Downloads', 'mac', version, 'chrome.zip'), store_paths[0])
+    assert os.stat(store_paths[0]).st_nlink == 3
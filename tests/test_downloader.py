@@ -0,0 +1,97 @@
+from requests.packages.urllib3.exceptions import ProtocolError
+from downloader import Downloader
+from mock_server import MockServer
+import requests
+import pytest
+import os
+
+name = 'Mac/681090/chrome-mac.zip'
+size = 100000
+
+
+class DroppedRaw(object):
+    """The response body, the connection drops after limit bytes"""
+
+    def __init__(self, raw, limit):
+        self.raw = raw
+        self.limit = limit
+        self.count = 0
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def read(self, amt=None):
+        if self.count >= self.limit:
+            raise ProtocolError('Connection dropped')
+        data = self.raw.read(min(amt or self.limit, self.limit - self.count))
+        self.count += len(data)
+
+        return data
+
+
+@pytest.fixture
+def server():
+    server = MockServer({name: {'size': str(size)}}).start()
+    yield server
+    server.stop()
+
+
+def get_downloader(drops=0, limit=size // 3, **kwargs):
+    """Function: get_downloader
+
+    :return: (downloader, the Range headers of the requests), the first drops responses drop after limit bytes
+    """
+
+    ranges = list()
+
+    def request(url, **request_kwargs):
+        ranges.append(request_kwargs.get('headers', {}).get('Range'))
+        res = requests.get(url, **request_kwargs)
+        if len(ranges) <= drops:
+            res.raw = DroppedRaw(res.raw, limit)
+        return res
+
+    return Downloader(request, **kwargs), ranges
+
+
+def test_dropped_connection_resumes_with_range(server, tmp_path):
+    item = server.get_item(name)
+    downloader, ranges = get_downloader(drops=2)
+    path = str(tmp_path / 'chrome-mac.zip')
+
+    assert downloader.download(item['mediaLink'], path, size=item['size'], md5=item['md5Hash']) is True
+    assert ranges == ['bytes=0-{0}'.format(size - 1),
+                      'bytes={0}-{1}'.format(size // 3, size - 1),
+                      'bytes={0}-{1}'.format(2 * (size // 3), size - 1)]
+    assert downloader.verify(path, item['size'], item['md5Hash']) is True
+    assert os.listdir(str(tmp_path)) == ['chrome-mac.zip']
+
+
+def test_part_file_of_interrupted_run_is_resumed(server, tmp_path):
+    item = server.get_item(name)
+    downloader, ranges = get_downloader()
+    path = str(tmp_path / 'chrome-mac.zip')
+    with open('{0}.part'.format(path), 'wb') as f:
+        f.write(server.get_content(name)[:1000])
+
+    assert downloader.download(item['mediaLink'], path, size=item['size'], md5=item['md5Hash']) is True
+    assert ranges == ['bytes=1000-{0}'.format(size - 1)]
+
+
+def test_md5_mismatch_is_rejected(server, tmp_path):
+    item = server.get_item(name)
+    downloader, ranges = get_downloader()
+    path = str(tmp_path / 'chrome-mac.zip')
+
+    assert downloader.download(item['mediaLink'], path, size=item['size'], md5='AAAAAAAAAAAAAAAAAAAAAA==') is False
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_parallel_ranges_are_joined(server, tmp_path):
+    item = server.get_item(name)
+    downloader, ranges = get_downloader(chunk_workers=4, min_chunk_size=size // 4)
+    path = str(tmp_path / 'chrome-mac.zip')
+
+    assert downloader.download(item['mediaLink'], path, size=item['size'], md5=item['md5Hash']) is True
+    assert len(ranges) == 4
+    assert os.listdir(str(tmp_path)) == ['chrome-mac.zip']
@@ -0,0 +1,13 @@
+from helpers import json_report, read_json, count_records, crawl
+import pytest
+
+
+def test_thread_engine_crawls_all_records(plain_report):
+    assert count_records(plain_report) == count_records(read_json(json_report))
+
+
+def test_async_engine_matches_thread_engine(mock_server, plain_report, tmp_path):
+    chromium_async = pytest.importorskip('chromium_async')
+    chromium, report = crawl(mock_server, tmp_path, crawler=chromium_async.AsyncChromium, checkpoint_file=None)
+
+    assert report == plain_report
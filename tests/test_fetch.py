@@ -0,0 +1,53 @@
+from helpers import get_kwargs, get_objects
+from concurrent.futures import ThreadPoolExecutor
+from mock_server import MockServer
+from chromium import Chromium
+
+
+def test_fetch_coalesces_the_same_url(tmp_path):
+    server = MockServer(get_objects([681090]), latency=0.1).start()
+    try:
+        chromium = Chromium(**get_kwargs(server, tmp_path, checkpoint_file=None))
+        url = chromium.chromium_prefix_listing_url_template.format('Mac/681090/')
+        pool = ThreadPoolExecutor(max_workers=4)
+        results = list(pool.map(chromium.fetch, [url] * 4))
+        pool.shutdown(wait=True)
+        results.append(chromium.fetch(url))
+    finally:
+        server.stop()
+
+    assert server.requests == 1
+    assert chromium.coalesced_requests_saved == 4
+    assert all(result == (200, results[0][1]) for result in results)
+    assert [item['name'] for item in results[0][1]['items']] == ['Mac/681090/chrome.zip']
+
+
+def test_fetch_keeps_the_parsed_json_only(tmp_path):
+    server = MockServer(get_objects([681090])).start()
+    try:
+        chromium = Chromium(**get_kwargs(server, tmp_path, checkpoint_file=None))
+        chromium.fetch(chromium.chromium_prefix_listing_url_template.format('Mac/681090/'))
+        chromium.fetch(chromium.chromium_prefix_listing_url_template.format('Mac/1/'))
+        chromium.fetch('{0}/not-found'.format(server.url))
+    finally:
+        server.stop()
+
+    results = [future.result() for future in chromium.coalesced_requests.values()]
+    assert [result[0] for result in results] == [200, 200, 404]
+    assert all(isinstance(result[1], (dict, type(None))) for result in results)
+    assert results[2][1] is None
+
+
+def test_crawl_coalesces_the_repeated_deps_requests(mock_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    chromium = Chromium(**get_kwargs(mock_server, tmp_path, checkpoint_file=None))
+    chromium.get_chromium_versions()
+    chromium.prepare_chromium_position_urls()
+    requests = mock_server.requests
+    chromium.get_chromium_positions()
+
+    versions = set(version for values in chromium.chromium_position_urls.values() for version in values.keys())
+    assert mock_server.requests - requests == len(versions)
+    repeated = sum(len(values) for values in chromium.chromium_position_urls.values()) - len(versions)
+    assert repeated > 0
+    assert chromium.coalesced_requests_saved >= repeated
@@ -0,0 +1,54 @@
+from helpers import get_kwargs, get_objects, crawl
+from history_store import HistoryStore
+from mock_server import MockServer
+import json
+
+
+def get_release(version, timestamp='2019-12-10 20:28:00.000000'):
+    """Function: get_release"""
+
+    return {'os': 'mac', 'channel': 'stable', 'version': version, 'timestamp': timestamp}
+
+
+def test_history_is_deduplicated(tmp_path):
+    history_json_file = str(tmp_path / 'mac.history.json')
+    # Written by the previous versions of this script, which appended the whole history.json on every run
+    with open(history_json_file, 'w') as f:
+        json.dump([get_release('77.0.3865.120'), get_release('77.0.3865.90'), get_release('77.0.3865.120')], f)
+    history_store = HistoryStore('mac', history_json_file)
+
+    assert sorted(history_store.load().keys()) == ['77.0.3865.120', '77.0.3865.90']
+
+    history_store.save([get_release('78.0.3904.70'), get_release('77.0.3865.120')])
+    with open(history_json_file) as f:
+        versions = [release['version'] for release in json.loads(f.read())]
+    assert versions == ['78.0.3904.70', '77.0.3865.120', '77.0.3865.90']
+
+
+def test_diff_returns_new_and_changed_releases(tmp_path):
+    history_store = HistoryStore('mac', str(tmp_path / 'mac.history.json'))
+    history_store.save([get_release('77.0.3865.120'), get_release('77.0.3865.90')])
+
+    changed = get_release('77.0.3865.90', timestamp='2019-12-11 20:28:00.000000')
+    assert history_store.diff([get_release('78.0.3904.70'), get_release('77.0.3865.120'),
+                               changed]) == [get_release('78.0.3904.70'), changed]
+
+
+def test_changed_release_reaches_the_report(tmp_path):
+    version = '77.0.3865.120'
+    server = MockServer(get_objects([681090, 681200], file_name='chrome-mac.zip'),
+                        releases={'mac': [get_release(version)]},
+                        positions={version: 681090}).start()
+    try:
+        chromium, report = crawl(server, tmp_path, checkpoint_file=None)
+        assert report['mac'][version]['download_position'] == 681090
+
+        # Republished with another base position
+        server.releases = {'mac': [get_release(version, timestamp='2019-12-11 20:28:00.000000')]}
+        server.positions = {version: 681200}
+        chromium, report = crawl(server, tmp_path, checkpoint_file=None, fore_crawl=False)
+    finally:
+        server.stop()
+
+    assert report['mac'][version]['download_position'] == 681200
+    assert list(report['mac'].keys()) == [version]
@@ -0,0 +1,73 @@
+from helpers import get_kwargs, get_objects
+from mock_server import MockServer
+from chromium import Chromium
+import requests
+import pytest
+
+
+@pytest.mark.parametrize('cached_positions, new_positions', [
+    ([681090, 681094], [681100, 681150]),
+    # Mac/1000001/ sorts before Mac/999999/ as text, and the 5 digit positions interleave with the 6 digit ones
+    ([15734, 99990, 500000, 999999], [1000001, 1000050]),
+])
+def test_incremental_refresh_picks_up_new_positions(tmp_path, cached_positions, new_positions):
+    server = MockServer(get_objects(cached_positions), page_size=1000).start()
+    try:
+        chromium = Chromium(**get_kwargs(server, tmp_path, checkpoint_file=None))
+        chromium.get_existed_positions()
+        assert sorted(chromium.chromium_existed_positions['mac']) == sorted(str(p) for p in cached_positions)
+
+        server.set_objects(get_objects(cached_positions + new_positions))
+        requests = server.requests
+        chromium = Chromium(**get_kwargs(server, tmp_path, checkpoint_file=None, fore_crawl=False))
+        chromium.get_existed_positions()
+    finally:
+        server.stop()
+
+    assert sorted(chromium.chromium_existed_positions['mac']) == sorted(str(p)
+                                                                        for p in cached_positions + new_positions)
+    assert chromium.get_nearest_position('mac', new_positions[0] - 1) == str(new_positions[0])
+    # Incremental: one page per refresh range, not a full listing
+    assert server.requests - requests <= 2 * len(chromium.os_type)
+
+
+def test_refresh_ranges_split_by_digit_count():
+    assert Chromium.get_refresh_ranges('Mac/', 999999, 100000) == [('Mac/999999/', 'Mac/9999990'),
+                                                                  ('Mac/1000000/', 'Mac/10999980')]
+    assert Chromium.get_refresh_ranges('Mac/', 681094, 1000) == [('Mac/681094/', 'Mac/6820930')]
+
+
+def test_parallel_listing_matches_serial(mock_server, tmp_path):
+    serial = Chromium(**get_kwargs(mock_server, tmp_path, checkpoint_file=None, refresh_positions=True))
+    serial.get_existed_positions(workers=1, range_digits=0)
+    parallel = Chromium(**get_kwargs(mock_server, tmp_path, checkpoint_file=None, refresh_positions=True))
+    parallel.get_existed_positions(workers=24, range_digits=2)
+
+    assert all(serial.chromium_existed_positions.values())
+    assert parallel.chromium_existed_positions == serial.chromium_existed_positions
+
+
+def test_failed_listing_is_not_cached(tmp_path):
+    positions = [15734, 500000, 681090]
+    server = MockServer(get_objects(positions), page_size=2).start()
+    try:
+        chromium = Chromium(**get_kwargs(server, tmp_path, checkpoint_file=None))
+        request = chromium.request
+
+        def drop_mac_range(url, **kwargs):
+            if 'startOffset=Mac/5&' in url:
+                raise requests.ConnectionError('Connection dropped')
+            return request(url, **kwargs)
+
+        chromium.request = drop_mac_range
+        chromium.get_existed_positions()
+        assert chromium.failed_listing_os_types == {'mac'}
+        assert sorted(chromium.chromium_existed_positions['win']) == sorted(str(p) for p in positions)
+
+        # The next run lists the mac positions again, instead of refreshing the incomplete cache
+        chromium = Chromium(**get_kwargs(server, tmp_path, checkpoint_file=None, fore_crawl=False))
+        chromium.get_existed_positions()
+    finally:
+        server.stop()
+
+    assert sorted(chromium.chromium_existed_positions['mac']) == sorted(str(p) for p in positions)
@@ -0,0 +1,56 @@
+from helpers import get_kwargs, get_objects
+from rate_limiter import RateLimiter
+from mock_server import MockServer
+from chromium import Chromium
+import pytest
+
+
+def test_slow_down_halves_the_rate_and_recovers_up_to_the_configured_rate():
+    rate_limiter = RateLimiter(host_rates={'example.com': 8}, min_rate=1)
+    rate_limiter.feedback('example.com', 429)
+    assert rate_limiter.get_bucket('example.com').rate == 4
+    rate_limiter.feedback('example.com', 503)
+    assert rate_limiter.get_bucket('example.com').rate == 2
+
+    for i in range(10):
+        rate_limiter.feedback('example.com', 200)
+    assert rate_limiter.get_bucket('example.com').rate == 8
+
+
+def test_retry_after_blocks_the_host():
+    rate_limiter = RateLimiter(host_rates={'example.com': 1000})
+    rate_limiter.feedback('example.com', 429, '0.5')
+
+    assert rate_limiter.reserve('example.com') > 0.4
+    assert rate_limiter.reserve('other.com') == 0
+
+
+@pytest.mark.parametrize('host_rates, default_rate', [({'example.com': 0}, 10), (None, 0), ({'example.com': -1}, 10)])
+def test_rate_must_be_positive(host_rates, default_rate):
+    with pytest.raises(Exception, match='greater than 0'):
+        RateLimiter(host_rates=host_rates, default_rate=default_rate)
+
+
+def test_request_retries_too_many_requests_through_the_rate_limiter(tmp_path):
+    server = MockServer(get_objects([681090]), error_status=429).start()
+    inject_error = server.inject_error
+    errors = [1]
+
+    def inject_one_error():
+        inject_error()
+        if errors[0] > 0:
+            errors[0] -= 1
+            return True
+        return False
+
+    server.inject_error = inject_one_error
+    try:
+        chromium = Chromium(**get_kwargs(server, tmp_path, checkpoint_file=None))
+        res = chromium.request(chromium.chromium_prefix_url_template.format('Mac/'), timeout=10)
+    finally:
+        server.stop()
+
+    assert res.status_code == 200
+    # Sent twice, and the 429 was seen by the limiter instead of being retried inside urllib3
+    assert server.requests == 2
+    assert chromium.rate_limiter.get_bucket(server.url.split('//')[1]).rate < 10000
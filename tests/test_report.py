@@ -0,0 +1,76 @@
+from helpers import json_report, read_json, count_records
+from chromium_index import ChromiumIndex
+from chromium import Chromium
+import shutil
+import json
+import os
+
+
+def read_ndjson(file_path):
+    """Function: read_ndjson
+
+    :return: list of the records, one per line
+    """
+
+    with open(file_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_report_rebuilds_stale_outputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    shutil.copyfile(json_report, 'chromium.stable.json')
+    # Written by an earlier run with ndjson, then cut while appending
+    with open('chromium.stable.ndjson', 'w') as f:
+        f.write('{"os": "mac"')
+    chromium = Chromium(checkpoint_file=None)
+    chromium.report(compact=True, ndjson=True)
+
+    assert read_json('chromium.stable.min.json') == read_json(json_report)
+    assert len(read_ndjson('chromium.stable.ndjson')) == count_records(read_json(json_report))
+
+
+def test_report_applies_changed_records(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    shutil.copyfile(json_report, 'chromium.stable.json')
+    Chromium(checkpoint_file=None).report(compact=True, ndjson=True)
+
+    changed = dict(read_json(json_report)['mac']['77.0.3865.120'], download_position=681091)
+    added = dict(changed, position_url=changed['position_url'].replace('77.0.3865.120', '99.0.0.1'))
+    chromium = Chromium(checkpoint_file=None)
+    chromium.chromium_downloads = {'mac': {'77.0.3865.120': changed, '99.0.0.1': added}}
+    assert chromium.get_report_delta(read_json(json_report)) == {'mac': {'77.0.3865.120': changed,
+                                                                         '99.0.0.1': added}}
+    chromium.report(compact=True, ndjson=True)
+
+    expected = read_json(json_report)
+    expected['mac']['77.0.3865.120'] = changed
+    expected['mac']['99.0.0.1'] = added
+    assert read_json('chromium.stable.json') == expected
+    assert read_json('chromium.stable.min.json') == expected
+    records = read_ndjson('chromium.stable.ndjson')
+    assert len(records) == count_records(expected)
+    assert [record['download_position'] for record in records
+            if record['os'] == 'mac' and record['version'] == '77.0.3865.120'] == [681091]
+    chromium_index = ChromiumIndex('chromium.stable.db')
+    try:
+        assert [record['download_position'] for record in chromium_index.lookup('77.0.3865.120', 'mac')] == [681091]
+        assert len(chromium_index.lookup('*')) == count_records(expected)
+    finally:
+        chromium_index.close()
+
+
+def test_report_appends_new_records_only(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    shutil.copyfile(json_report, 'chromium.stable.json')
+    Chromium(checkpoint_file=None).report(ndjson=True)
+    existed = read_json(json_report)
+
+    chromium = Chromium(checkpoint_file=None)
+    # Crawled again, but unchanged
+    chromium.chromium_downloads = {'mac': {'77.0.3865.120': existed['mac']['77.0.3865.120']}}
+    assert chromium.get_report_delta(existed) == dict()
+    json_report_mtime = os.path.getmtime('chromium.stable.json')
+    chromium.report(ndjson=True)
+
+    assert os.path.getmtime('chromium.stable.json') == json_report_mtime
+    assert len(read_ndjson('chromium.stable.ndjson')) == count_records(existed)
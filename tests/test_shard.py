@@ -0,0 +1,66 @@
+from helpers import get_kwargs, read_json
+from chromium import Chromium
+import sqlite3
+import glob
+import re
+
+os_listing_pattern = re.compile(r'prefix=[^/&]+/&')
+
+
+def run_shard(server, work_dir, index, count, listing_urls):
+    """Function: run_shard
+
+    Run the shard, and collect the urls of the os prefix listings it requested
+    """
+
+    chromium = Chromium(**get_kwargs(server, work_dir, shard='{0}/{1}'.format(index, count)))
+    request = chromium.request
+
+    def record_listing(url, **kwargs):
+        if os_listing_pattern.search(url):
+            listing_urls.append(url)
+        return request(url, **kwargs)
+
+    chromium.request = record_listing
+    chromium.run()
+
+
+def count_cached_positions(work_dir):
+    """Function: count_cached_positions"""
+
+    connection = sqlite3.connect(str(work_dir / 'chromium.positions.db'))
+    try:
+        return connection.execute('SELECT COUNT(*) FROM positions').fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_shard_merge_matches_plain_run(mock_server, plain_report, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # The positions command, once before the shards
+    Chromium(**get_kwargs(mock_server, tmp_path, checkpoint_file=None)).get_existed_positions()
+    cached_positions = count_cached_positions(tmp_path)
+    listing_urls = list()
+    for index in range(3):
+        run_shard(mock_server, tmp_path, index, 3, listing_urls)
+    partial_reports = sorted(glob.glob('chromium.stable.shard-*-of-3.json'))
+    assert len(partial_reports) == 3
+
+    Chromium(checkpoint_file=None).merge(partial_reports)
+
+    assert read_json('chromium.stable.json') == plain_report
+    # The shards read the cache even with --force, instead of listing all the os prefixes again
+    assert listing_urls == list()
+    assert count_cached_positions(tmp_path) == cached_positions
+
+
+def test_shard_without_positions_cache_does_not_write_it(mock_server, plain_report, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    listing_urls = list()
+    for index in range(2):
+        run_shard(mock_server, tmp_path, index, 2, listing_urls)
+    Chromium(checkpoint_file=None).merge(sorted(glob.glob('chromium.stable.shard-*-of-2.json')))
+
+    assert read_json('chromium.stable.json') == plain_report
+    assert listing_urls
+    assert count_cached_positions(tmp_path) == 0